@@ -0,0 +1,375 @@
+import argparse
+import random
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+from fuzzywuzzy import fuzz
+from pdf2image import convert_from_path
+import matching
+from parse import ContributionsOver250Parser, process_image_cells
+
+
+def bench_ocr(args):
+    """
+    Times `process_image_cells` on the first pages of a PDF for each OCR batching mode, reporting the
+    per-page latency and how often each mode's cell text agrees with the one-call-per-cell baseline.
+    """
+    pages = convert_from_path(args.input, first_page=1, last_page=args.pages)
+    timings: dict[str, list[float]] = {mode: [] for mode in args.modes}
+    outputs: dict[str, list] = {mode: [] for mode in args.modes}
+
+    for page in pages:
+        image_cv = cv2.cvtColor(np.array(page), cv2.COLOR_RGB2BGR)
+        for mode in args.modes:
+            start = time.perf_counter()
+            rows = process_image_cells(image_cv, mode)
+            timings[mode].append(time.perf_counter() - start)
+            outputs[mode].append(rows)
+
+    baseline = statistics.mean(timings[args.modes[0]])
+    print(f"{len(pages)} page(s) of {args.input}\n")
+    print(f"{'mode':<6} {'mean s/page':>12} {'median':>8} {'speedup':>8} {'agreement':>10}")
+    for mode in args.modes:
+        cells = [
+            (a, b)
+            for page_a, page_b in zip(outputs[args.modes[0]], outputs[mode])
+            for row_a, row_b in zip(page_a, page_b)
+            for a, b in zip(row_a, row_b)
+        ]
+        agreement = sum(a == b for a, b in cells) / len(cells) if cells else 1.0
+        print(
+            f"{mode:<6} {statistics.mean(timings[mode]):>12.3f} {statistics.median(timings[mode]):>8.3f}"
+            f" {baseline / statistics.mean(timings[mode]):>7.2f}x {agreement:>9.1%}"
+        )
+
+
+def legacy_contributions_over_250(row_text: list[str]) -> dict:
+    """
+    `ContributionsOver250Parser.parse` as it was before it matched the contributor cell in one pass, kept
+    to compare against. Note that it rewrites `row_text[1]` as it goes.
+    """
+    date = row_text[0]
+
+    name_regex = r"Name: (.*?)[\n\s]+(?:Mailing )?Address:"
+    name_match = re.search(name_regex, row_text[1], flags=re.DOTALL)
+    if name_match:
+        row_text[1] = row_text[1][: name_match.start(1) - 6].strip() + row_text[1][name_match.end(1) :].strip()
+
+    mailing_address_regex = r"Mailing Address: (.*?)[\n\s]+Employer"
+    mailing_address_match = re.search(mailing_address_regex, row_text[1])
+    mailing_address = mailing_address_match.group(1).replace("\n", " ").strip() if mailing_address_match else ""
+    if mailing_address_match:
+        row_text[1] = (
+            row_text[1][: mailing_address_match.start(1) - 17].strip()
+            + row_text[1][mailing_address_match.end(1) :].strip()
+        )
+
+    address_regex = r"Address: (.*?)[\n\s]*(?:Employer|Mailing|$)"
+    address_match = re.search(address_regex, row_text[1], flags=re.DOTALL)
+    address = address_match.group(1).replace("\n", " ").strip() if address_match else ""
+    if address_match:
+        row_text[1] = (
+            row_text[1][: address_match.start(1) - 9].strip() + row_text[1][address_match.end(1) :].strip()
+        )
+
+    emp_regex = r"Employer/Occupation: (.*?)[\n\s]*$"
+    emp_match = re.search(emp_regex, row_text[1], flags=re.DOTALL)
+    employer_occupation = emp_match.group(1).replace("\n", "").strip() if emp_match else ""
+
+    amount = row_text[-1].replace("$", "").replace(",", "") if re.match(r"\$[\d,.]+", str(row_text[-1])) else "0"
+
+    return {
+        "date": date,
+        "name": name_match.group(1).replace("\n", " ").strip() if name_match else "",
+        "address": address,
+        "mailing_address": mailing_address if mailing_address else None,
+        "employer_occupation": employer_occupation if employer_occupation else None,
+        "election_type": row_text[2] if row_text[2] in ["Primary", "General"] else "",
+        "amount": amount,
+    }
+
+
+def contribution_row_texts(db_path: str) -> list[list[str]]:
+    """
+    Section 3 table rows, as read off the page, rebuilt from the parsed rows in a database written by
+    `parse.py --format sqlite`.
+    """
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT date, name, address, mailing_address, employer_occupation, election_type, amount"
+        " FROM contributions_over_250"
+    ).fetchall()
+    conn.close()
+    return [
+        [
+            date,
+            f"Name: {name}\nAddress: {address}\n"
+            + (f"Mailing Address: {mailing_address}\n" if mailing_address else "")
+            + f"Employer/Occupation: {employer_occupation or ''}",
+            election_type,
+            f"${amount:,.2f}",
+        ]
+        for date, name, address, mailing_address, employer_occupation, election_type, amount in rows
+    ]
+
+
+def bench_parse(args):
+    """
+    Times `ContributionsOver250Parser.parse` against the legacy implementation on rows rebuilt from a
+    database of parsed contributions, checking that both parse every row the same.
+    """
+    row_texts = contribution_row_texts(args.db) * args.repeat
+    parser = ContributionsOver250Parser()
+
+    timings: dict[str, list[float]] = {"legacy": [], "parse": []}
+    for _ in range(args.runs):
+        # the legacy parser rewrites its input, so it gets a fresh copy of every row (made outside the timing)
+        copies = [list(row) for row in row_texts]
+        start = time.perf_counter()
+        legacy = [legacy_contributions_over_250(row) for row in copies]
+        timings["legacy"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        parsed = [parser.parse(row) for row in row_texts]
+        timings["parse"].append(time.perf_counter() - start)
+
+    mismatches = sum(a != b for a, b in zip(legacy, parsed))
+    print(f"{len(row_texts)} row(s) from {args.db}, best of {args.runs} run(s)\n")
+    print(f"{'parser':<7} {'total s':>8} {'us/row':>8} {'speedup':>8}")
+    for name, runs in timings.items():
+        print(
+            f"{name:<7} {min(runs):>8.3f} {min(runs) / len(row_texts) * 1e6:>8.2f}"
+            f" {min(timings['legacy']) / min(runs):>7.2f}x"
+        )
+    print(f"\n{mismatches} row(s) parsed differently")
+
+
+def legacy_find_best_match(csv_row, db_rows):
+    """
+    `merge.find_best_match` as it was before matching was blocked, kept to compare against.
+    """
+    best_match = None
+    highest_score = 0
+
+    for db_row in db_rows:
+        csv_name = csv_row['Last Name'] if csv_row['Middle Name'].strip() + csv_row['Suffix'].strip() != 0 else f"{csv_row['First Name']} {csv_row['Last Name']}"
+        name_score = fuzz.ratio(csv_name.upper(), db_row['name'].upper())
+
+        csv_emp = (
+            "" if any([csv_row['Employer'] is None, csv_row['Employer'] == ""]) else
+            csv_row['Employer'] if csv_row['Occupation'] == "Other" else f"{csv_row['Employer']} {csv_row['Occupation']}"
+        )
+        db_emp = (
+            "" if db_row['employer_occupation'] is None else
+            "RETIRED" if db_row['employer_occupation'] == "RETIRED RETIRED" else db_row['employer_occupation']
+        )
+        employer_occupation_score = fuzz.ratio(csv_emp.upper(), db_emp.upper())
+
+        csv_date = datetime.strptime(csv_row['Receipt Date'], '%m/%d/%Y %I:%M:%S %p')
+        db_date = datetime.strptime(db_row['date'], '%m/%d/%Y')
+        date_diff = abs((csv_date - db_date).days)
+        date_score = 100 if date_diff == 0 else max(0, 100 - date_diff * 5)
+
+        csv_amount = float(csv_row['Receipt Amount'])
+        db_amount = float(db_row['amount'])
+        amount_diff = abs(csv_amount - db_amount)
+        amount_score = 100 if amount_diff == 0 else max(0, 100 - amount_diff * 10)
+
+        total_score = 0.5 * name_score + 0.1 * employer_occupation_score + 0.2 * date_score + 0.2 * amount_score
+
+        if total_score > highest_score:
+            highest_score = total_score
+            best_match = db_row
+
+    return best_match, highest_score
+
+
+def parsed_contributions(db_path: str) -> list[dict]:
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(row) for row in conn.execute("SELECT * FROM contributions_over_250")]
+    conn.close()
+    return rows
+
+
+def _misread(text: str, rng: random.Random) -> str:
+    if not text:
+        return text
+    i = rng.randrange(len(text))
+    return text[:i] + rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") + text[i + 1 :]
+
+
+def csv_rows(parsed: list[dict], count: int, seed: int) -> list[tuple[dict, dict]]:
+    """
+    Rows of the bulk CSV download made up from `count` of the `parsed` rows, as if they were their
+    counterparts in it: the same contribution, with the name, date or amount now and then off by a little
+    (like a misread by OCR, or a date entered a few days late). Each is paired with the row it was made from.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for row in rng.sample(parsed, min(count, len(parsed))):
+        names = row["name"].split() or [""]
+        employer, _, occupation = (row["employer_occupation"] or "").rpartition(" ")
+        day = datetime.strptime(row["date"], "%m/%d/%Y")
+        day = day.replace(day=max(day.day - (rng.random() < 0.2) * rng.randint(1, 3), 1), hour=rng.randint(0, 23))
+        rows.append(
+            (row, {
+                "First Name": names[0].title(),
+                "Middle Name": "",
+                "Last Name": (_misread(names[-1], rng) if rng.random() < 0.2 else names[-1]).title(),
+                "Suffix": "",
+                "Employer": employer.title(),
+                "Occupation": occupation.title() or "Other",
+                "Receipt Date": day.strftime("%m/%d/%Y %I:%M:%S %p"),
+                "Receipt Amount": f"{float(row['amount']) + (rng.random() < 0.1) * rng.choice([-1, 1, 5]):.2f}",
+            })
+        )
+    return rows
+
+
+def bench_match(args):
+    """
+    Times `Matcher.match_all`, scoring every parsed row and only the blocked candidates, and assigning
+    matches one to one, against the legacy `find_best_match` on CSV rows made up from a database of
+    parsed contributions. Reports how often each picks the row a CSV row was made from, and how often it
+    picks the same row as the legacy scan.
+    """
+    parsed = parsed_contributions(args.db)
+    sources, rows = zip(*csv_rows(parsed, args.rows, args.seed))
+
+    start = time.perf_counter()
+    legacy = [legacy_find_best_match(row, parsed) for row in rows[: args.legacy_rows]]
+    legacy_time = (time.perf_counter() - start) / max(len(legacy), 1)
+
+    timings, results = {}, {}
+    for name, blocking, one_to_one in [("full", False, False), ("blocked", True, False), ("1:1", True, True)]:
+        start = time.perf_counter()
+        results[name] = list(matching.Matcher(parsed, blocking).match_all(rows, one_to_one))
+        timings[name] = (time.perf_counter() - start) / len(rows)
+
+    matcher = matching.Matcher(parsed)
+    candidates = statistics.mean(len(matcher.candidates(matching.from_csv(row))) for row in rows)
+    print(f"{len(rows)} CSV row(s) ({len(legacy)} for legacy) against {len(parsed)} parsed row(s) from {args.db}\n")
+    print(f"{'matcher':<8} {'ms/row':>8} {'speedup':>8} {'correct':>8} {'as legacy':>10} {'reused':>7}")
+    for name, matches in [("legacy", legacy), *results.items()]:
+        per_row = legacy_time if name == "legacy" else timings[name]
+        correct = sum(match is source for (match, _), source in zip(matches, sources)) / len(matches)
+        same = sum(a is b for (a, _), (b, _) in zip(legacy, matches)) / max(len(legacy), 1)
+        matched = [id(match) for match, _ in matches if match is not None]
+        print(
+            f"{name:<8} {per_row * 1e3:>8.2f} {legacy_time / per_row:>7.1f}x {correct:>8.1%} {same:>10.1%}"
+            f" {len(matched) - len(set(matched)):>7}"
+        )
+    print(f"\n{candidates:.0f} blocked candidate(s) scored per row on average")
+
+
+def import_times(command: list[str]) -> tuple[float, dict[str, float]]:
+    """
+    Runs `command` (a script and its arguments) under `python -X importtime`, returning how long it took
+    in seconds and how long each module it imported directly took to import, including what that module
+    imported in turn.
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", *command], capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(f"{' '.join(command)} failed:\n{result.stderr[-2000:]}")
+    imported = {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package", nested imports indented under it
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match and not match.group(2):
+            imported[match.group(3)] = int(match.group(1)) / 1e6
+    return elapsed, imported
+
+
+def bench_startup(args):
+    """
+    Times `--help` of each command line tool, failing if any takes longer than the budget, and lists the
+    imports that take longest.
+    """
+    over = []
+    print(f"{'script':<16} {'best s':>7} {'imports s':>10}  slowest imports")
+    for script in args.scripts:
+        runs = [import_times([script, "--help"]) for _ in range(args.runs)]
+        elapsed, imported = min(runs, key=lambda run: run[0])
+        slowest = sorted(imported.items(), key=lambda item: item[1], reverse=True)[: args.top]
+        print(
+            f"{script:<16} {elapsed:>7.3f} {sum(imported.values()):>10.3f}  "
+            + ", ".join(f"{name} {seconds:.3f}" for name, seconds in slowest)
+        )
+        if elapsed > args.budget:
+            over.append(script)
+    if over:
+        print(f"\nOver the {args.budget}s budget: {', '.join(over)}")
+        sys.exit(1)
+    print(f"\nEvery script is within the {args.budget}s budget")
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Benchmarks for the wvcfrs-parser pipeline")
+    subparsers = argparser.add_subparsers(dest="benchmark", required=True)
+
+    ocr_parser = subparsers.add_parser("ocr", help="Per-page OCR latency by tesseract batching mode")
+    ocr_parser.add_argument("--input", type=str, help="Input PDF file", required=True)
+    ocr_parser.add_argument("--pages", type=int, help="Number of pages to benchmark", default=5)
+    ocr_parser.add_argument(
+        "--modes",
+        nargs="+",
+        help="Batching modes to compare, the first is the baseline",
+        default=["cell", "row", "page"],
+        choices=["cell", "row", "page"],
+    )
+    ocr_parser.set_defaults(func=bench_ocr)
+
+    parse_parser = subparsers.add_parser("parse", help="Section 3 row parsing throughput against the legacy parser")
+    parse_parser.add_argument(
+        "--db",
+        type=str,
+        help="SQLite database of parsed section 3 rows to rebuild row text from",
+        default="../notebooks/morrisey-2024.sqlite3",
+    )
+    parse_parser.add_argument("--repeat", type=int, help="Number of times to repeat the rows", default=10)
+    parse_parser.add_argument("--runs", type=int, help="Number of timed runs", default=5)
+    parse_parser.set_defaults(func=bench_parse)
+
+    match_parser = subparsers.add_parser("match", help="CSV-to-parsed row matching against the legacy full scan")
+    match_parser.add_argument(
+        "--db",
+        type=str,
+        help="SQLite database of parsed section 3 rows to match against",
+        default="../notebooks/morrisey-2024.sqlite3",
+    )
+    match_parser.add_argument("--rows", type=int, help="Number of CSV rows to make up and match", default=1000)
+    match_parser.add_argument(
+        "--legacy-rows", type=int, help="Number of them to match with the (slow) legacy scan", default=50
+    )
+    match_parser.add_argument("--seed", type=int, help="Seed for making up CSV rows", default=0)
+    match_parser.set_defaults(func=bench_match)
+
+    startup_parser = subparsers.add_parser(
+        "startup", help="Start-up time of each tool's --help against a budget, and its slowest imports"
+    )
+    startup_parser.add_argument(
+        "--scripts",
+        nargs="+",
+        help="Scripts to time",
+        default=["parse.py", "ingest.py", "merge.py", "locate-pages.py"],
+    )
+    startup_parser.add_argument("--budget", type=float, help="Most seconds --help may take", default=0.5)
+    startup_parser.add_argument("--runs", type=int, help="Number of timed runs of each, the best is kept", default=3)
+    startup_parser.add_argument("--top", type=int, help="Number of slowest imports to list", default=3)
+    startup_parser.set_defaults(func=bench_startup)
+
+    args = argparser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
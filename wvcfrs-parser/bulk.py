@@ -0,0 +1,135 @@
+import sqlite3
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, List
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _org_id(row: Dict) -> int | None:
+    try:
+        return int(row["OrgID"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _receipt_day(row: Dict) -> str | None:
+    try:
+        return datetime.strptime(row["Receipt Date"], "%m/%d/%Y %I:%M:%S %p").date().isoformat()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class ContributionStore:
+    """
+    A local SQLite copy of the WVSoS bulk contributions (CON) CSV downloads, so a candidate's rows are
+    found with an indexed query instead of a scan of the whole state's year. Every column of the CSV is
+    kept as is, alongside the `year` it was downloaded for, the `org_id` (the `OrgID` column as a number)
+    and the `receipt_day` (the date of `Receipt Date`, as YYYY-MM-DD); rows are indexed by year and
+    org_id (and `Report Name`, once a CSV with that column is loaded), and by year and receipt_day.
+    """
+
+    table = "con"
+    derived = {"year": "INTEGER NOT NULL", "org_id": "INTEGER", "receipt_day": "TEXT"}
+
+    def __init__(self, path: str, batch_size: int = 5000):
+        self.path = path
+        self.batch_size = batch_size
+        self.conn = None
+
+    def connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            columns = ",\n    ".join(f"{name} {type}" for name, type in self.derived.items())
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (\n    {columns}\n)")
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS con_loads (
+                year INTEGER PRIMARY KEY,
+                rows INTEGER NOT NULL,
+                loaded_at REAL NOT NULL
+            )
+            """)
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_org ON {self.table} (year, org_id)")
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_day ON {self.table} (year, receipt_day)")
+            self.conn.commit()
+        return self.conn
+
+    def columns(self) -> List[str]:
+        """
+        The CSV columns stored, in the order they were first seen.
+        """
+        return [
+            row[1]
+            for row in self.connect().execute(f"PRAGMA table_info({self.table})")
+            if row[1] not in self.derived
+        ]
+
+    def loaded(self, year: int) -> bool:
+        return self.connect().execute("SELECT 1 FROM con_loads WHERE year = ?", (year,)).fetchone() is not None
+
+    def load(self, year: int, rows: Iterable[Dict]) -> int:
+        """
+        Replaces the rows of `year` with `rows` (dicts keyed by CSV column, e.g. from
+        `cfrs.CFRSClient.contributions_csv`), inserting them `batch_size` at a time as they are read, in
+        one transaction. Returns how many were loaded.
+        """
+        conn = self.connect()
+        rows = iter(rows)
+        loaded = 0
+        with conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE year = ?", (year,))
+            while batch := list(islice(rows, self.batch_size)):
+                columns = self.columns()
+                for name in batch[0]:
+                    if name not in columns and name not in self.derived:
+                        conn.execute(f"ALTER TABLE {self.table} ADD COLUMN {_quote(name)} TEXT")
+                        columns.append(name)
+                        if name == "Report Name":
+                            conn.execute(
+                                f"CREATE INDEX IF NOT EXISTS {self.table}_org_report"
+                                f" ON {self.table} (year, org_id, {_quote('Report Name')})"
+                            )
+                names = [*self.derived, *columns]
+                conn.executemany(
+                    f"INSERT INTO {self.table} ({', '.join(map(_quote, names))})"
+                    f" VALUES ({', '.join('?' * len(names))})",
+                    [(year, _org_id(row), _receipt_day(row), *(row.get(name) for name in columns)) for row in batch],
+                )
+                loaded += len(batch)
+            conn.execute(
+                "INSERT OR REPLACE INTO con_loads (year, rows, loaded_at) VALUES (?, ?, ?)",
+                (year, loaded, time.time()),
+            )
+        return loaded
+
+    def rows(
+        self, year: int, org_id: int, report_name: str = None, since: str = None, until: str = None
+    ) -> List[Dict]:
+        """
+        The rows of `year` for the committee `org_id`, optionally only those of the report named
+        `report_name` and received between `since` and `until` (YYYY-MM-DD, inclusive), in the order
+        they appear in the CSV.
+        """
+        columns = self.columns()
+        query = f"SELECT {', '.join(map(_quote, columns))} FROM {self.table} WHERE year = ? AND org_id = ?"
+        params = [year, org_id]
+        if report_name is not None:
+            query += f" AND {_quote('Report Name')} = ?"
+            params.append(report_name)
+        if since is not None:
+            query += " AND receipt_day >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND receipt_day <= ?"
+            params.append(until)
+        return [dict(zip(columns, row)) for row in self.connect().execute(query + " ORDER BY rowid", params)]
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
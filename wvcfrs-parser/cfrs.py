@@ -0,0 +1,201 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Dict, Iterable, Iterator, List
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HTTPCache:
+    """
+    An on-disk cache of HTTP responses in a directory, one body file and one metadata file (its URL,
+    `ETag` and `Last-Modified`) per URL. Cached responses are revalidated with the server on every use
+    (`If-None-Match`/`If-Modified-Since`), so they are only downloaded again when they change; responses
+    without either header can't be revalidated and aren't cached.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, url: str) -> str:
+        return os.path.join(self.path, hashlib.blake2b(url.encode(), digest_size=20).hexdigest())
+
+    def validators(self, url: str) -> Dict[str, str]:
+        """
+        The conditional request headers to revalidate the cached response for `url` with, if there is one.
+        """
+        try:
+            with open(self.key(url) + ".json") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if meta.get("url") != url or not os.path.exists(self.key(url) + ".body"):
+            return {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def body(self, url: str) -> str:
+        return self.key(url) + ".body"
+
+    def store(self, url: str, response: requests.Response) -> str | None:
+        """
+        Streams the body of `response` into the cache, returning the path it was written to, or None if
+        the response can't be revalidated later (and so wasn't cached).
+        """
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return None
+        # written to a temporary file and moved into place, so concurrent readers never see half a body
+        fd, temp = tempfile.mkstemp(dir=self.path, suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            for chunk in response.iter_content(chunk_size=1 << 16):
+                f.write(chunk)
+        os.replace(temp, self.body(url))
+        fd, temp = tempfile.mkstemp(dir=self.path, suffix=".part")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"url": url, "etag": etag, "last_modified": last_modified}, f)
+        os.replace(temp, self.key(url) + ".json")
+        return self.body(url)
+
+
+class CFRSClient:
+    """
+    A client for the WV Secretary of State's Campaign Finance Reporting System (CFRS) API at `base_url`.
+    Requests made by a thread share its pool of `pool_size` connections (every thread has its own session,
+    as `requests.Session` isn't thread-safe) and are retried `retries` times, with exponential backoff,
+    on connection errors and 429/5xx responses. With a `cache` directory, responses are cached
+    on disk (see `HTTPCache`), so the bulk CSV downloads and report PDFs are only downloaded again when
+    they change. Like the CFRS website, its certificate isn't verified unless `verify` is set.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "https://cfrs.wvsos.gov",
+        cache: str = None,
+        pool_size: int = 8,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 60,
+        verify: bool = False,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.cache = HTTPCache(cache) if cache else None
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.verify = verify
+        self.__local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        The session of the calling thread.
+        """
+        if not hasattr(self.__local, "session"):
+            session = requests.Session()
+            session.verify = self.verify
+            adapter = HTTPAdapter(
+                pool_connections=self.pool_size,
+                pool_maxsize=self.pool_size,
+                max_retries=Retry(
+                    total=self.retries,
+                    backoff_factor=self.backoff,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=("GET",),
+                    raise_on_status=False,
+                ),
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self.__local.session = session
+        return self.__local.session
+
+    def open(self, path: str, params: Dict = None) -> IO[bytes]:
+        """
+        The body of the response to a GET of `path` (relative to `base_url`) with query `params`, as a
+        binary file: from the cache if it hasn't changed, otherwise streamed from the server (into the
+        cache, or a temporary file), so large downloads are never held in memory.
+        """
+        url = requests.Request("GET", f"{self.base_url}/{path.lstrip('/')}", params=params).prepare().url
+        headers = self.cache.validators(url) if self.cache else {}
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304 and headers:
+                return open(self.cache.body(url), "rb")
+            response.raise_for_status()
+            cached = self.cache.store(url, response) if self.cache else None
+            if cached:
+                return open(cached, "rb")
+            body = tempfile.TemporaryFile()
+            for chunk in response.iter_content(chunk_size=1 << 16):
+                body.write(chunk)
+        body.seek(0)
+        return body
+
+    def get(self, path: str, params: Dict = None) -> bytes:
+        with self.open(path, params) as f:
+            return f.read()
+
+    def get_json(self, path: str, params: Dict = None):
+        return json.loads(self.get(path, params))
+
+    def search_candidates(self, name: str) -> List[Dict]:
+        return self.get_json(
+            "CFIS_APIService/api/Search/GetPublicSiteBasicSearchResult",
+            {"searchText": name.strip(), "searchType": "ALL", "pageNumber": 1, "pageSize": 50},
+        ).get("CandidateInformationslist", [])
+
+    def candidate_info(self, candidate_id: int) -> Dict:
+        return self.get_json("CFIS_APIService/api/Organization/GetCandidatesInformation", {"memberId": candidate_id})
+
+    def candidate_filings(self, candidate: Dict) -> List[Dict]:
+        return self.get_json(
+            "CFIS_APIService/api/Filing/GetFilings",
+            {
+                "officeID": candidate["OfficeId"],
+                "committeeID": candidate["IDNumber"],
+                "electionYear": candidate["ElectionYear"],
+                "districtId": candidate["DistrictId"],
+                "electionId": candidate["ElectionId"],
+                "pageNumber": 1,
+                "pageSize": 50,
+            },
+        )
+
+    def report(self, report_filename: str) -> bytes:
+        """
+        The PDF of a filing, by its `ReportFileName`.
+        """
+        return self.get(f"CFIS_APIService/ReportsOutput/{report_filename.strip()}")
+
+    def reports(self, report_filenames: Iterable[str], workers: int = 4) -> Iterator[tuple[str, bytes]]:
+        """
+        The PDF of every filing in `report_filenames`, as (filename, PDF) pairs in the same order,
+        downloaded `workers` at a time, each worker thread with its own session.
+        """
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            report_filenames = list(report_filenames)
+            yield from zip(report_filenames, executor.map(self.report, report_filenames))
+
+    def contributions_csv(self, year: int) -> Iterator[Dict]:
+        """
+        The rows of the year's bulk contributions (CON) CSV download, for every committee in the state,
+        read as they are iterated over rather than all at once.
+        """
+        with self.open(
+            "CFIS_APIService/api/DataDownload/GetCSVDownloadReport",
+            {"year": year, "transactionType": "CON", "reportFormat": "csv", "fileName": f"CON_{year}.csv"},
+        ) as f:
+            # the download starts with a byte order mark
+            yield from csv.DictReader(io.TextIOWrapper(f, encoding="utf-8-sig", newline=""))
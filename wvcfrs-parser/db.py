@@ -0,0 +1,188 @@
+import sqlite3
+from collections import Counter
+from itertools import islice
+from typing import Dict, Iterable
+import metrics
+
+
+class SQLiteWriter:
+    """
+    Bulk-loads parsed rows into a table of a SQLite database with `executemany`, committing every
+    `batch_size` rows. The table is created from `columns` (name -> SQL type) plus a `source_filing`
+    column, so rows from many filings can be appended to one database, and the `page` of the filing each
+    row was read from; tables created by older versions of this tool gain any missing columns.
+
+    Filings written page by page with `replace_pages` also have a fingerprint of every page recorded in
+    the `page_fingerprints` table, along with how many rows it produced.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        table: str,
+        columns: Dict[str, str],
+        indexes: Iterable[str] = (),
+        batch_size: int = 500,
+    ):
+        self.path = path
+        self.table = table
+        self.columns = {**columns, "source_filing": "TEXT", "page": "INTEGER"}
+        self.indexes = list(indexes)
+        self.batch_size = batch_size
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        columns = ",\n    ".join(f"{name} {type}" for name, type in self.columns.items())
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (\n    {columns}\n)")
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({self.table})")}
+        for name, type in self.columns.items():
+            if name not in existing:
+                # NOT NULL columns can't be added to a table that may already have rows
+                conn.execute(f"ALTER TABLE {self.table} ADD COLUMN {name} {type.replace('NOT NULL', '')}")
+        for column in [*self.indexes, "source_filing"]:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_{column} ON {self.table} ({column})")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_page ON {self.table} (source_filing, page)")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS page_fingerprints (
+            table_name TEXT NOT NULL,
+            source_filing TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            fingerprint TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            PRIMARY KEY (table_name, source_filing, page)
+        )
+        """)
+        return conn
+
+    def insert(
+        self, conn: sqlite3.Connection, rows: Iterable[Dict], source_filing: str = None, page: int = None
+    ) -> int:
+        """
+        Inserts `rows` on a connection from `connect` without committing, so they can be made part of a
+        larger transaction. Returns how many were inserted.
+        """
+        names = list(self.columns)
+        insert = f"INSERT INTO {self.table} ({', '.join(names)}) VALUES ({', '.join(':' + n for n in names)})"
+        batch = [{**row, "source_filing": source_filing, "page": page} for row in rows]
+        conn.executemany(insert, batch)
+        return len(batch)
+
+    def page_fingerprints(self, conn: sqlite3.Connection, source_filing: str) -> Dict[int, str]:
+        """
+        The fingerprint recorded for every page of `source_filing` in this table, by page.
+        """
+        return dict(
+            conn.execute(
+                "SELECT page, fingerprint FROM page_fingerprints WHERE table_name = ? AND source_filing = ?",
+                (self.table, source_filing),
+            )
+        )
+
+    def replace_pages(
+        self,
+        conn: sqlite3.Connection,
+        pages: Iterable[tuple[int, str | None, list[Dict] | None]],
+        source_filing: str,
+        base: str = None,
+        page_range: tuple[int, int] = None,
+    ) -> Counter:
+        """
+        Replaces the rows of the filing `base` (by default `source_filing`) with the rows of `pages`, in
+        one transaction, tagged `source_filing`, and records the fingerprint of each page.
+
+        `pages` are (page, fingerprint, rows) triples, whose rows are None when they are the rows `base`
+        already has for a page with that fingerprint: rows of pages that haven't moved are left as they
+        are, and those of pages that have are copied to their new page. Rows of every other page of
+        `base` are deleted, or with a `page_range` (first, last) that only part of the filing was read
+        from, those of its other pages within it; rows of pages outside of it are left as they are. Rows
+        written without a page (see `write`) can't be told apart, and are always deleted. Pages without a
+        fingerprint couldn't be read: whatever rows and fingerprint `base` has for them are kept as they
+        are, so a page that failed is read again next time rather than losing its rows.
+
+        Returns how many pages were kept as they were, failed, copied and written, and how many rows were
+        deleted and inserted.
+        """
+        base = base or source_filing
+        old = self.page_fingerprints(conn, base)
+        found = {}
+        for page, fingerprint in sorted(old.items()):
+            found.setdefault(fingerprint, page)
+        pages = list(pages)
+        failed = {page for page, fingerprint, rows in pages if fingerprint is None}
+        kept = failed | {page for page, fingerprint, rows in pages if rows is None and old.get(page) == fingerprint}
+        if page_range:
+            kept |= {page for page in old if not page_range[0] <= page <= page_range[1]}
+        names = [name for name in self.columns if name not in ("source_filing", "page")]
+        stats = Counter()
+        with metrics.timer("write"), conn:
+            # read before the pages they were on are deleted, as those may be taken by other pages now
+            copied = {
+                page: [
+                    dict(zip(names, row))
+                    for row in conn.execute(
+                        f"SELECT {', '.join(names)} FROM {self.table} WHERE source_filing = ? AND page = ? ORDER BY rowid",
+                        (base, found[fingerprint]),
+                    )
+                ]
+                for page, fingerprint, rows in pages
+                if rows is None and page not in kept
+            }
+            removed = [(base, page) for page in old if page not in kept]
+            stats["rows_deleted"] += conn.execute(
+                f"DELETE FROM {self.table} WHERE source_filing = ? AND page IS NULL", (base,)
+            ).rowcount
+            for params in removed:
+                stats["rows_deleted"] += conn.execute(
+                    f"DELETE FROM {self.table} WHERE source_filing = ? AND page = ?", params
+                ).rowcount
+            conn.executemany(
+                "DELETE FROM page_fingerprints WHERE table_name = ? AND source_filing = ? AND page = ?",
+                [(self.table, *params) for params in removed],
+            )
+            if base != source_filing:
+                # an amendment takes the place of the filing it amends
+                stats["rows_deleted"] += conn.execute(
+                    f"DELETE FROM {self.table} WHERE source_filing = ?", (source_filing,)
+                ).rowcount
+                conn.execute(
+                    "DELETE FROM page_fingerprints WHERE table_name = ? AND source_filing = ?",
+                    (self.table, source_filing),
+                )
+                conn.execute(f"UPDATE {self.table} SET source_filing = ? WHERE source_filing = ?", (source_filing, base))
+                conn.execute(
+                    "UPDATE page_fingerprints SET source_filing = ? WHERE table_name = ? AND source_filing = ?",
+                    (source_filing, self.table, base),
+                )
+            for page, fingerprint, rows in pages:
+                if page in kept:
+                    stats["pages_failed" if page in failed else "pages_kept"] += 1
+                    continue
+                stats["pages_copied" if rows is None else "pages_written"] += 1
+                inserted = self.insert(conn, copied[page] if rows is None else rows, source_filing, page)
+                stats["rows_inserted"] += inserted
+                if fingerprint is not None:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO page_fingerprints (table_name, source_filing, page, fingerprint, rows)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (self.table, source_filing, page, fingerprint, inserted),
+                    )
+        return stats
+
+    def write(self, rows: Iterable[Dict], source_filing: str = None) -> int:
+        """
+        Appends `rows` (dicts keyed by column name) to the table, returning how many were written.
+        """
+        conn = self.connect()
+        written = 0
+        try:
+            rows = iter(rows)
+            while batch := list(islice(rows, self.batch_size)):
+                with metrics.timer("write"):
+                    written += self.insert(conn, batch, source_filing)
+                    conn.commit()
+        finally:
+            conn.close()
+        return written
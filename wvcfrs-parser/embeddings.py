@@ -0,0 +1,150 @@
+import hashlib
+import os
+import sqlite3
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    An on-disk store of text embeddings in SQLite, keyed by a hash of the text and the name of the
+    model that encoded it, so repeated runs only encode text they haven't seen.
+    """
+
+    def __init__(self, path: str, model: str):
+        self.path = path
+        self.model = model
+        self.conn = None
+
+    def connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, timeout=60)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                model TEXT NOT NULL,
+                key TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, key)
+            )
+            """)
+        return self.conn
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.blake2b(text.encode(), digest_size=20).hexdigest()
+
+    def get(self, texts: list[str]) -> dict[str, np.ndarray]:
+        """
+        The cached embedding of each of `texts` that has one, by text.
+        """
+        keys = {self.key(text): text for text in texts}
+        found = {}
+        conn = self.connect()
+        batches = list(keys)
+        # stay under SQLite's limit on the number of parameters in a query
+        for i in range(0, len(batches), 900):
+            batch = batches[i : i + 900]
+            for key, vector in conn.execute(
+                f"SELECT key, vector FROM embedding_cache WHERE model = ? AND key IN ({', '.join('?' * len(batch))})",
+                (self.model, *batch),
+            ):
+                found[keys[key]] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def put(self, texts: list[str], vectors: np.ndarray):
+        conn = self.connect()
+        conn.executemany(
+            "INSERT OR IGNORE INTO embedding_cache (model, key, vector) VALUES (?, ?, ?)",
+            [
+                (self.model, self.key(text), np.asarray(vector, dtype=np.float32).tobytes())
+                for text, vector in zip(texts, vectors)
+            ],
+        )
+        conn.commit()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class Encoder:
+    """
+    Encodes text into unit-length vectors with a Sentence Transformers model read from `model_path`, a
+    local directory (e.g. one `SentenceTransformer.save` wrote): nothing is downloaded. The model is only
+    loaded the first time text it hasn't cached needs encoding.
+    """
+
+    def __init__(self, model_path: str, cache: EmbeddingCache = None, batch_size: int = 64):
+        if not os.path.isdir(model_path):
+            raise FileNotFoundError(f"No Sentence Transformers model directory at {model_path}")
+        self.model_path = model_path
+        self.cache = cache
+        self.batch_size = batch_size
+        self.__model = None
+
+    @property
+    def model(self):
+        if self.__model is None:
+            # never reach out to the Hugging Face Hub, even for files the model directory lacks
+            os.environ.setdefault("HF_HUB_OFFLINE", "1")
+            from sentence_transformers import SentenceTransformer
+
+            self.__model = SentenceTransformer(self.model_path, local_files_only=True)
+        return self.__model
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """
+        The embedding of every one of `texts`, as a (len(texts), dimensions) float32 array.
+        """
+        vectors = self.cache.get(texts) if self.cache else {}
+        missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+        if missing:
+            encoded = self.model.encode(
+                missing, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True
+            ).astype(np.float32)
+            vectors.update(zip(missing, encoded))
+            if self.cache:
+                self.cache.put(missing, encoded)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([vectors[text] for text in texts])
+
+
+class IVFIndex:
+    """
+    An approximate nearest neighbor index over unit-length vectors (an inverted file): the vectors are
+    clustered with k-means into `lists` lists, and a query is only compared with the vectors in the
+    `probes` lists whose centroids are nearest it. Similarity is the dot (cosine) product.
+    """
+
+    def __init__(self, vectors: np.ndarray, lists: int = None, probes: int = 8, seed: int = 0):
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        lists = min(lists or max(round(len(self.vectors) ** 0.5), 1), len(self.vectors))
+        self.probes = max(min(probes, lists), 1)
+        if lists <= 1:
+            self.centroids = self.vectors.mean(axis=0, keepdims=True) if len(self.vectors) else self.vectors
+            self.lists = [np.arange(len(self.vectors))]
+            return
+        # scikit-learn takes a while to import, and is only needed here
+        from sklearn.cluster import KMeans
+
+        kmeans = KMeans(n_clusters=lists, n_init=1, random_state=seed).fit(self.vectors)
+        self.centroids = kmeans.cluster_centers_.astype(np.float32)
+        self.lists = [np.flatnonzero(kmeans.labels_ == i) for i in range(lists)]
+
+    def search(self, queries: np.ndarray, k: int) -> list[np.ndarray]:
+        """
+        The indexes of (up to) the `k` vectors most similar to each of `queries`, most similar first.
+        """
+        if not len(self.vectors):
+            return [np.empty(0, dtype=np.int64) for _ in range(len(queries))]
+        nearest_lists = np.argsort(-(queries @ self.centroids.T), axis=1)[:, : self.probes]
+        neighbors = []
+        for query, probed in zip(queries, nearest_lists):
+            candidates = np.concatenate([self.lists[i] for i in probed])
+            similarity = self.vectors[candidates] @ query
+            top = np.argsort(-similarity, kind="stable")[:k]
+            neighbors.append(candidates[top])
+        return neighbors
@@ -0,0 +1,174 @@
+import cv2
+import json
+import numpy as np
+from collections import Counter
+from typing import NamedTuple
+import metrics
+
+
+class Grid(NamedTuple):
+    """
+    The table found on a page. `rows` holds the (y0, y1) band between every pair of consecutive
+    horizontal rules, top to bottom; `cells` holds a (row, column, x0, y0, x1, y1) entry for every cell,
+    ordered top to bottom and left to right within a row. Rows without vertical rules have no cells.
+    """
+
+    rows: np.ndarray
+    cells: np.ndarray
+
+    def boxes(self) -> list[list[tuple[int, int, int, int]]]:
+        """
+        The (x0, y0, x1, y1) box of every cell, grouped by row.
+        """
+        boxes = [[] for _ in range(len(self.rows))]
+        for r, _, x0, y0, x1, y1 in self.cells.tolist():
+            boxes[r].append((x0, y0, x1, y1))
+        return boxes
+
+
+def runs(profile: np.ndarray) -> np.ndarray:
+    """
+    The [start, end) ranges of every run of True in a 1-D boolean `profile`, as an (n, 2) array.
+    """
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], profile.astype(np.int8), [0]))))
+    return edges.reshape(-1, 2)
+
+
+def rules(image: np.ndarray, length: int, vertical: bool = False) -> np.ndarray:
+    """
+    The ink of `image` that lies on horizontal (or `vertical`) rules at least `length` pixels long, found
+    by opening it with a 1-pixel-tall (or wide) kernel. Lines of pixels are independent of each other
+    under such a kernel, so only those with enough ink to hold a rule at all are opened; the rest are
+    known to come out empty.
+    """
+    lines = cv2.transpose(image) if vertical else image
+    ink = cv2.reduce(lines, 1, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel() // 255
+    candidates = np.flatnonzero(ink >= length)
+    opened = np.zeros_like(lines)
+    if len(candidates):
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (length, 1))
+        opened[candidates] = cv2.morphologyEx(lines[candidates], cv2.MORPH_OPEN, kernel, iterations=2)
+    return cv2.transpose(opened) if vertical else opened
+
+
+class ColumnTemplate(NamedTuple):
+    """
+    The column layout every page of a section's table shares, as the (x0, x1) span of each column in
+    fractions of the page width so it applies at any DPI. Learned from the first pages of a section
+    with `learn` or loaded from a JSON file written by `save`.
+    """
+
+    columns: list[tuple[float, float]]
+
+    # how far (in fractions of the page width) a column boundary may drift between pages and still be
+    # the same boundary
+    tolerance = 0.005
+
+    @classmethod
+    def load(cls, path: str) -> "ColumnTemplate":
+        with open(path) as f:
+            return cls([tuple(column) for column in json.load(f)["columns"]])
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"columns": [list(column) for column in self.columns]}, f, indent=4)
+
+    @classmethod
+    def from_grid(cls, page_grid: Grid, width: int) -> "ColumnTemplate | None":
+        """
+        The layout of the most common number of columns among the rows of `page_grid`, or None if no
+        row has more than one column.
+        """
+        counts = Counter(page_grid.cells[:, 0].tolist())
+        widest = Counter(count for count in counts.values() if count > 1).most_common(1)
+        if not widest:
+            return None
+        rows = [r for r, count in counts.items() if count == widest[0][0]]
+        cells = page_grid.cells[np.isin(page_grid.cells[:, 0], rows)]
+        spans = np.median(cells[:, [2, 4]].reshape(len(rows), -1, 2), axis=0) / width
+        return cls([tuple(span) for span in spans.tolist()])
+
+    @classmethod
+    def learn(cls, templates: list["ColumnTemplate | None"]) -> "ColumnTemplate | None":
+        """
+        The average of `templates` (from the first pages of a section), if they all agree.
+        """
+        if not templates or any(
+            template is None
+            or len(template.columns) != len(templates[0].columns)
+            or np.abs(np.subtract(template.columns, templates[0].columns)).max() > cls.tolerance
+            for template in templates
+        ):
+            return None
+        return cls([tuple(span) for span in np.mean([t.columns for t in templates], axis=0).tolist()])
+
+    def match(self, band: np.ndarray, rule_length: int) -> list[tuple[int, int]] | None:
+        """
+        The (x0, x1) pixel span of each column within `band`, one row of a thresholded page, if the
+        row's vertical rules are where the template expects them. A rule counts as present if its
+        stretch of ink covers at least half of the row; a few missing (e.g. faint) rules are tolerated.
+        """
+        width = band.shape[1]
+        spans = [(round(x0 * width), round(x1 * width)) for x0, x1 in self.columns]
+        tolerance = max(round(self.tolerance * width), 2)
+        ink = cv2.reduce(band, 0, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel() // 255
+        boundaries = [x0 for x0, _ in spans] + [spans[-1][1]]
+        present = sum(
+            ink[max(x - tolerance, 0) : x + tolerance].max(initial=0) >= max(band.shape[0] // 2, rule_length)
+            for x in boundaries
+        )
+        return spans if present >= len(boundaries) * 3 / 4 else None
+
+
+@metrics.timed("grid")
+def detect(adaptive_thresh: np.ndarray, dpi: int = 200, template: ColumnTemplate = None) -> Grid:
+    """
+    Locates the table of a thresholded page from its ruling lines, in one pass over the page: rows are
+    read off the projection of its horizontal rules onto the y axis, and the columns of every row off
+    the projection of the vertical rules within that row onto the x axis.
+
+    With a `template`, rows whose rules line up with it take its columns and the vertical rules are only
+    looked for (on the whole page, at once) if some row doesn't.
+    """
+    # the minimum rule length is tuned for pages rendered at pdf2image's default 200 DPI
+    rule_length = max(round(40 * dpi / 200), 1)
+    horizontal = rules(adaptive_thresh, rule_length)
+    horizontal_rules = runs(horizontal.max(axis=1) > 0)
+    if len(horizontal_rules) < 2:
+        return Grid(np.empty((0, 2), dtype=np.int64), np.empty((0, 6), dtype=np.int64))
+    rows = np.column_stack((horizontal_rules[:-1, 1], horizontal_rules[1:, 0]))
+
+    table_y0, table_y1 = rows[0, 0], rows[-1, 1]
+    vertical = None
+
+    cells = []
+    for r, (y0, y1) in enumerate(rows.tolist()):
+        if y1 <= y0:
+            continue
+        # a rule can't be longer than the row it divides
+        row_rule_length = min(rule_length, y1 - y0)
+        spans = template.match(adaptive_thresh[y0:y1], row_rule_length) if template else None
+        if spans is None:
+            if vertical is None:
+                vertical = rules(adaptive_thresh[table_y0:table_y1], rule_length, vertical=True)
+            coverage = cv2.reduce(vertical[y0 - table_y0 : y1 - table_y0], 0, cv2.REDUCE_SUM, dtype=cv2.CV_32S)
+            columns = runs(coverage.ravel() // 255 >= row_rule_length)
+            spans = [(columns[c, 1], columns[c + 1, 0]) for c in range(len(columns) - 1)]
+        for c, (x0, x1) in enumerate(spans):
+            cells.append((r, c, x0, y0, x1, y1))
+    return Grid(rows, np.array(cells, dtype=np.int64).reshape(-1, 6))
+
+
+def draw(image: np.ndarray, grid: Grid) -> np.ndarray:
+    """
+    A copy of `image` (BGR or grayscale) with the row bands of `grid` marked and its cells outlined and
+    labelled "row,column", for checking what the grid detection found on a page.
+    """
+    overlay = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image.copy()
+    for y0, y1 in grid.rows.tolist():
+        cv2.line(overlay, (0, y0), (overlay.shape[1] - 1, y0), (0, 160, 0), 1)
+        cv2.line(overlay, (0, y1 - 1), (overlay.shape[1] - 1, y1 - 1), (0, 160, 0), 1)
+    for r, c, x0, y0, x1, y1 in grid.cells.tolist():
+        cv2.rectangle(overlay, (x0, y0), (x1 - 1, y1 - 1), (0, 0, 255), 1)
+        cv2.putText(overlay, f"{r},{c}", (x0 + 2, y0 + 12), cv2.FONT_HERSHEY_SIMPLEX, 0.35, (255, 0, 0), 1)
+    return overlay
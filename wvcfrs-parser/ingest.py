@@ -0,0 +1,302 @@
+from __future__ import annotations
+import argparse
+import glob
+import os
+import sqlite3
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from tqdm import tqdm
+from typing import Iterator, NamedTuple
+import imports
+import metrics
+import parse
+
+db = imports.lazy("db")
+ocr = imports.lazy("ocr")
+pdf = imports.lazy("pdf")
+sections = imports.lazy("sections")
+
+
+class Job(NamedTuple):
+    filing: str
+    page: int
+    args: tuple
+
+
+def list_filings(input: str) -> list[tuple[str, str]]:
+    """
+    The (name, path) of every filing to ingest: each PDF under `input` when it is a directory, named by
+    its path relative to it, or each path listed in `input` when it is a manifest (one per line, relative
+    to the manifest; blank lines and lines starting with # are skipped), named as listed.
+    """
+    if os.path.isdir(input):
+        paths = sorted(
+            path for path in glob.glob(os.path.join(input, "**", "*"), recursive=True) if path.lower().endswith(".pdf")
+        )
+        return [(os.path.relpath(path, input), path) for path in paths]
+
+    filings = []
+    with open(input) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                filings.append((line, os.path.join(os.path.dirname(input), line)))
+    return filings
+
+
+def create_job_tables(conn: sqlite3.Connection):
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS ingest_filings (
+        filing TEXT NOT NULL,
+        section INTEGER NOT NULL,
+        path TEXT NOT NULL,
+        first_page INTEGER NOT NULL,
+        last_page INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        finished_at REAL,
+        PRIMARY KEY (filing, section)
+    );
+    CREATE TABLE IF NOT EXISTS ingest_pages (
+        filing TEXT NOT NULL,
+        section INTEGER NOT NULL,
+        page INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        rows INTEGER,
+        error TEXT,
+        finished_at REAL,
+        PRIMARY KEY (filing, section, page)
+    );
+    """)
+    conn.commit()
+
+
+def plan_filing(
+    conn: sqlite3.Connection, filing: str, path: str, args: argparse.Namespace
+) -> tuple[pdf.PDFPages, list[pdf.TextPage]]:
+    """
+    The pages of `filing` to read and its text layer. The page range is worked out (with --auto-section,
+    by locating the section) the first time the filing is seen and recorded, so a resumed run reads the
+    same pages.
+    """
+    pages = pdf.PDFPages(path, args.dpi)
+    text_pages = pdf.read_text_layer(pages.path) if not args.force_ocr else []
+    planned = conn.execute(
+        "SELECT first_page, last_page FROM ingest_filings WHERE filing = ? AND section = ?", (filing, args.section)
+    ).fetchone()
+    if planned is None:
+        planned = (1, pages.pages)
+        if args.auto_section:
+            found = sections.find_section_pages(pages, args.section, args.ocr_backend, text_pages, args.workers)
+            if found is None:
+                print(f"Section {args.section} not found in {filing}, reading every page")
+            planned = found or planned
+        conn.execute(
+            "INSERT INTO ingest_filings (filing, section, path, first_page, last_page, status) VALUES (?, ?, ?, ?, ?, ?)",
+            (filing, args.section, path, *planned, "pending"),
+        )
+        conn.commit()
+    return pages.between(*planned), text_pages
+
+
+def plan_filings(
+    conn: sqlite3.Connection, filings: list[tuple[str, str]], args: argparse.Namespace
+) -> list[tuple[str, str]]:
+    """
+    Plans (see `plan_filing`) every one of `filings` that hasn't been yet, before any of their pages are
+    read: locating a filing's section OCRs in a pool of its own, which would otherwise run alongside the
+    one pages are read in. Returns the filings that could be planned.
+    """
+    planned = []
+    for filing, path in tqdm(filings, desc="Planning filings...", unit="filing"):
+        seen = conn.execute(
+            "SELECT 1 FROM ingest_filings WHERE filing = ? AND section = ?", (filing, args.section)
+        ).fetchone()
+        if seen is None:
+            try:
+                plan_filing(conn, filing, path, args)
+            except Exception as e:
+                print(f"Error reading {filing}: {e}")
+                continue
+        planned.append((filing, path))
+    return planned
+
+
+def iter_jobs(conn: sqlite3.Connection, filings: list[tuple[str, str]], args: argparse.Namespace) -> Iterator[Job]:
+    """
+    A job for every page of `filings` that hasn't been ingested yet, filing by filing.
+    """
+    for filing, path in filings:
+        status = conn.execute(
+            "SELECT status FROM ingest_filings WHERE filing = ? AND section = ?", (filing, args.section)
+        ).fetchone()
+        if status and status[0] == "done":
+            continue
+        try:
+            pages, text_pages = plan_filing(conn, filing, path, args)
+        except Exception as e:
+            print(f"Error reading {filing}: {e}")
+            continue
+        done = {
+            page
+            for page, in conn.execute(
+                "SELECT page FROM ingest_pages WHERE filing = ? AND section = ? AND status = 'done'",
+                (filing, args.section),
+            )
+        }
+        for ref in pages.refs():
+            if ref.page not in done:
+                yield Job(filing, ref.page, (ref, parse._text_page(text_pages, ref.page - 1)))
+        # a filing with every page already done still needs marking as done
+        if len(done) >= len(pages):
+            finish_filing(conn, filing, args.section)
+
+
+def finish_filing(conn: sqlite3.Connection, filing: str, section: int):
+    first_page, last_page = conn.execute(
+        "SELECT first_page, last_page FROM ingest_filings WHERE filing = ? AND section = ?", (filing, section)
+    ).fetchone()
+    (done,) = conn.execute(
+        "SELECT COUNT(*) FROM ingest_pages WHERE filing = ? AND section = ? AND status = 'done'", (filing, section)
+    ).fetchone()
+    if done >= last_page - first_page + 1:
+        conn.execute(
+            "UPDATE ingest_filings SET status = 'done', finished_at = ? WHERE filing = ? AND section = ?",
+            (time.time(), filing, section),
+        )
+        conn.commit()
+
+
+def record_page(
+    conn: sqlite3.Connection,
+    writer: db.SQLiteWriter,
+    parser: parse.SectionParser,
+    job: Job,
+    section: int,
+    rows: list[list[str]] = None,
+    error: str = None,
+) -> int:
+    """
+    Writes the parsed rows of a page and marks its job done (or failed, with `error`) in one transaction,
+    so a page's rows are never written twice, nor lost, across interrupted runs.
+    """
+    written = 0
+    parsed = []
+    if error is None:
+        with metrics.timer("parse"):
+            parsed = [parser.parse(row) for row in rows if parser.is_data_row(row)]
+    with metrics.timer("write"):
+        written = writer.insert(conn, parsed, job.filing, job.page)
+        conn.execute(
+            "INSERT OR REPLACE INTO ingest_pages (filing, section, page, status, rows, error, finished_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job.filing, section, job.page, "failed" if error else "done", written, error, time.time()),
+        )
+        conn.commit()
+    if error is None:
+        finish_filing(conn, job.filing, section)
+    return written
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description="Parse a directory (or manifest) of WVSoS campaign finance report PDFs into one SQLite database"
+    )
+    argparser.add_argument(
+        "--input",
+        type=str,
+        help="Directory of PDF files, or a manifest file listing one PDF path per line",
+        required=True,
+    )
+    argparser.add_argument(
+        "--output",
+        type=str,
+        help="SQLite database to write rows (and the progress of the run, for resuming it) to",
+        required=True,
+    )
+    parse.add_reading_arguments(argparser, workers=0)
+    argparser.add_argument(
+        "--auto-section",
+        action="store_true",
+        help="Locate the pages --section is on in each filing before reading them, instead of reading every page",
+    )
+    args = argparser.parse_args()
+    args.workers = args.workers or os.cpu_count()
+    start = time.perf_counter()
+
+    parser = parse.parsers[args.section]()
+    writer = db.SQLiteWriter(args.output, parser.table, parser.columns, parser.indexes)
+    conn = writer.connect()
+    create_job_tables(conn)
+
+    filings = list_filings(args.input)
+    print(f"Ingesting section {args.section} of {len(filings)} filing(s) into {args.output}")
+    if args.auto_section:
+        filings = plan_filings(conn, filings, args)
+
+    cache = ocr.OCRCache(args.ocr_cache, args.ocr_cache_size * 1024 * 1024) if args.ocr_cache else None
+    process_page = partial(
+        parse._process_page,
+        batch=args.ocr_batch,
+        backend=args.ocr_backend,
+        cache=cache,
+        column_profiles=None if args.uniform_ocr else parser.column_profiles,
+    )
+    counters = Counter()
+    totals = Counter()
+    progress = tqdm(desc="Ingesting pages...", unit="page")
+
+    def record(job: Job, rows: list[list[str]] = None, counts: Counter = None, error: str = None):
+        if error:
+            print(f"Error processing {job.filing} page {job.page}: {error}")
+        totals["rows"] += record_page(conn, writer, parser, job, args.section, rows, error)
+        totals["failed" if error else "pages"] += 1
+        counters.update(counts or {})
+        metrics.merge(counts or {})
+        progress.update()
+
+    def failed(job: Job, error: str):
+        record(job, error=error)
+
+    def collect(executor: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        job = pending[0][0]
+        result, executor = parse._collect_page(pending, executor, args.workers, process_page, failed)
+        # failed pages were recorded as such by `failed`
+        if result is not None:
+            rows, counts, _ = result
+            record(job, rows=rows, counts=counts)
+        return executor
+
+    executor = ProcessPoolExecutor(max_workers=args.workers)
+    pending = deque()
+    try:
+        for job in iter_jobs(conn, filings, args):
+            executor = parse._submit_page(pending, executor, args.workers, process_page, job, job.args)
+            # keep a bounded window of pages in flight, across filings, so the pool never drains
+            # between one filing and the next
+            if len(pending) >= args.workers * 2:
+                executor = collect(executor)
+        while pending:
+            executor = collect(executor)
+    finally:
+        executor.shutdown(cancel_futures=True)
+        progress.close()
+        conn.close()
+
+    print(
+        f"{totals['pages']} page(s) read, {totals['failed']} failed (retried on the next run),"
+        f" {totals['rows']} row(s) written"
+    )
+    if counters["cells"]:
+        print(
+            f"OCR: {counters['blank_cells']} of {counters['cells']} cells and {counters['blank_rows']} rows were blank"
+            f" and skipped, {counters['ocr_calls']} tesseract calls made"
+        )
+    if args.profile or args.metrics:
+        profile = metrics.report(counters, time.perf_counter() - start)
+        metrics.write_report(profile, args.profile, args.metrics)
+
+
+if __name__ == "__main__":
+    main()
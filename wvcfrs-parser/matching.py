@@ -0,0 +1,293 @@
+import re
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+import numpy as np
+from rapidfuzz import fuzz, process
+from typing import Dict, Iterable, Iterator, NamedTuple
+import embeddings
+
+
+class Contribution(NamedTuple):
+    """
+    The fields of a contribution that are compared when matching, normalized once up front: upper-cased
+    name and employer/occupation, the date as a day number (`date.toordinal`) and the amount, either of
+    which is None if it couldn't be read. `text` is the contributor's full name and employer/occupation,
+    as compared by meaning when matching with embeddings.
+    """
+
+    name: str
+    employer_occupation: str
+    day: int | None
+    amount: float | None
+    text: str
+
+
+def _day(date: str, format: str) -> int | None:
+    try:
+        return datetime.strptime(date, format).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def _amount(amount) -> float | None:
+    try:
+        return float(amount)
+    except (TypeError, ValueError):
+        return None
+
+
+def from_csv(row: Dict) -> Contribution:
+    """
+    A row of the WVSoS bulk contributions (CON) CSV download.
+    """
+    employer_occupation = (
+        ""
+        if not row["Employer"]
+        else row["Employer"] if row["Occupation"] == "Other" else f"{row['Employer']} {row['Occupation']}"
+    )
+    return Contribution(
+        # only the last name has ever been compared: the full name is never used, whatever the other parts
+        row["Last Name"].upper(),
+        employer_occupation.upper(),
+        # the time of day doesn't matter, as it is never negative nor a whole day
+        _day(row["Receipt Date"], "%m/%d/%Y %I:%M:%S %p"),
+        _amount(row["Receipt Amount"]),
+        " ".join(
+            part for part in [row["First Name"], row["Last Name"], employer_occupation] if part and part.strip()
+        ).upper(),
+    )
+
+
+def from_parsed(row: Dict) -> Contribution:
+    """
+    A row of section 3 (contributions over $250) parsed by `parse.py`.
+    """
+    employer_occupation = row["employer_occupation"] or ""
+    employer_occupation = "RETIRED" if employer_occupation == "RETIRED RETIRED" else employer_occupation.upper()
+    return Contribution(
+        row["name"].upper(),
+        employer_occupation,
+        _day(row["date"], "%m/%d/%Y"),
+        _amount(row["amount"]),
+        f"{row['name']} {employer_occupation}".strip().upper(),
+    )
+
+
+def ratios(queries: list[str], choices: list[str]) -> np.ndarray:
+    """
+    The similarity (0 to 100, rounded) of every string of `queries` to every string of `choices`, as a
+    (len(queries), len(choices)) matrix computed in native code on every CPU. As with `fuzzywuzzy`, two
+    empty strings are 100 alike and an empty string is 0 alike to any other.
+    """
+    similarity = np.round(process.cdist(queries, choices, scorer=fuzz.ratio, dtype=np.float64, workers=-1))
+    empty_queries = np.array([not query for query in queries], dtype=bool)
+    empty_choices = np.array([not choice for choice in choices], dtype=bool)
+    similarity[empty_queries[:, None] | empty_choices[None, :]] = 0
+    similarity[empty_queries[:, None] & empty_choices[None, :]] = 100
+    return similarity
+
+
+def closeness(a: np.ndarray, b: np.ndarray, points: float) -> np.ndarray:
+    """
+    How close every value of `a` is to every value of `b`: 100 if equal, less `points` for every unit
+    apart, down to 0 (or 0 if either is NaN).
+    """
+    diff = np.abs(a[:, None] - b[None, :])
+    return np.nan_to_num(np.where(diff == 0, 100, np.maximum(0, 100 - diff * points)), nan=0)
+
+
+_soundex_codes = {
+    letter: code
+    for letters, code in [("BFPV", "1"), ("CGJKQSXZ", "2"), ("DT", "3"), ("L", "4"), ("MN", "5"), ("R", "6")]
+    for letter in letters
+}
+
+
+def soundex(word: str) -> str:
+    """
+    The American Soundex code of `word` ("ROBERT" -> "R163"), which names that sound alike (and most OCR
+    misreadings of a name) share. Empty if `word` has no letters.
+    """
+    word = re.sub(r"[^A-Z]", "", word.upper())
+    if not word:
+        return ""
+    code, last = word[0], _soundex_codes.get(word[0], "")
+    for letter in word[1:]:
+        digit = _soundex_codes.get(letter, "")
+        if digit and digit != last:
+            code += digit
+        # letters coded the same either side of an H or W are coded once, either side of a vowel twice
+        if letter not in "HW":
+            last = digit
+    return (code + "000")[:4]
+
+
+def name_keys(name: str) -> set[str]:
+    """
+    The Soundex code of every word of `name`, as neither side reliably puts the last name last.
+    """
+    return {soundex(word) for word in name.split() if len(word) > 1} - {""}
+
+
+class Matcher:
+    """
+    Finds the parsed contribution that best matches each row of the bulk CSV download.
+
+    A CSV row and a parsed row score from 0 to 100: a weighted sum of how alike their names (50%) and
+    employers/occupations (10%) are, and how close their dates (20%, 5 points off per day) and amounts
+    (20%, 10 points off per dollar) are. Scores are computed a chunk of CSV rows at a time, as a matrix
+    against the parsed rows.
+
+    Rather than scoring every parsed row, the parsed rows are normalized and indexed once, by the Soundex
+    codes of their name and by their amount and date, and a CSV row is only scored against the rows it
+    shares a block with: those whose name sounds like its last name, and those within `amount_window`
+    dollars and `date_window` days of it (the range either score is above 0 in). If no row shares a block
+    with it, every row is scored, as if `blocking` were off.
+
+    With an `encoder`, the name block is replaced by the `semantic_candidates` rows whose name and
+    employer/occupation are nearest a CSV row's in meaning, found in an approximate nearest neighbor index
+    of their embeddings, which also catches names spelled differently (or read wrong) in ways that don't
+    sound alike.
+    """
+
+    amount_window = 10
+    date_window = 20
+    # scores computed at once (CSV rows x parsed rows), bounding the memory a chunk of CSV rows takes
+    chunk_scores = 1 << 22
+    # best-scoring parsed rows per CSV row considered when assigning one to one
+    assignment_candidates = 10
+    semantic_candidates = 50
+
+    def __init__(self, rows: Iterable[Dict], blocking: bool = True, encoder: embeddings.Encoder = None):
+        self.rows = list(rows)
+        self.contributions = [from_parsed(row) for row in self.rows]
+        self.blocking = blocking
+        self.names = [contribution.name for contribution in self.contributions]
+        self.employer_occupations = [contribution.employer_occupation for contribution in self.contributions]
+        self.days = np.array([np.nan if c.day is None else c.day for c in self.contributions], dtype=np.float64)
+        self.amounts = np.array([np.nan if c.amount is None else c.amount for c in self.contributions])
+        self.by_name = defaultdict(list)
+        self.by_amount_date = defaultdict(list)
+        for i, contribution in enumerate(self.contributions):
+            for key in name_keys(contribution.name):
+                self.by_name[key].append(i)
+            if contribution.amount is not None and contribution.day is not None:
+                self.by_amount_date[self.__bucket(contribution)].append(i)
+        self.encoder = encoder
+        if encoder is not None:
+            self.index = embeddings.IVFIndex(encoder.encode([c.text for c in self.contributions]))
+
+    def __bucket(self, contribution: Contribution) -> tuple[int, int]:
+        return int(contribution.amount // self.amount_window), contribution.day // self.date_window
+
+    def candidates(self, contribution: Contribution, neighbors: Iterable[int] = None) -> list[int]:
+        """
+        The indexes of the rows sharing a block with `contribution`, in order, or of every row. With an
+        encoder, `neighbors` are the rows nearest it in meaning.
+        """
+        if not self.blocking:
+            return range(len(self.rows))
+        candidates = set()
+        if self.encoder is not None:
+            candidates.update(neighbors.tolist() if neighbors is not None else [])
+        else:
+            for key in name_keys(contribution.name):
+                candidates.update(self.by_name.get(key, ()))
+        if contribution.amount is not None and contribution.day is not None:
+            amount_bucket, date_bucket = self.__bucket(contribution)
+            for a in range(amount_bucket - 1, amount_bucket + 2):
+                for d in range(date_bucket - 1, date_bucket + 2):
+                    candidates.update(self.by_amount_date.get((a, d), ()))
+        return sorted(candidates) if candidates else range(len(self.rows))
+
+    def scores(self, contributions: list[Contribution]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The indexes of the rows any of `contributions` is scored against, and the (len(contributions),
+        len(indexes)) matrix of their scores, -inf where a contribution doesn't share a block with a row.
+        """
+        if self.blocking:
+            neighbors = [None] * len(contributions)
+            if self.encoder is not None:
+                queries = self.encoder.encode([c.text for c in contributions])
+                neighbors = self.index.search(queries, self.semantic_candidates)
+            candidates = [
+                np.asarray(self.candidates(c, n), dtype=np.int64) for c, n in zip(contributions, neighbors)
+            ]
+            columns = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.int64)
+        else:
+            columns = np.arange(len(self.rows))
+        days = np.array([np.nan if c.day is None else c.day for c in contributions], dtype=np.float64)
+        amounts = np.array([np.nan if c.amount is None else c.amount for c in contributions], dtype=np.float64)
+        name_score = ratios([c.name for c in contributions], [self.names[i] for i in columns])
+        employer_occupation_score = ratios(
+            [c.employer_occupation for c in contributions], [self.employer_occupations[i] for i in columns]
+        )
+        date_score = closeness(days, self.days[columns], 5)
+        amount_score = closeness(amounts, self.amounts[columns], 10)
+        scores = 0.5 * name_score + 0.1 * employer_occupation_score + 0.2 * date_score + 0.2 * amount_score
+        if self.blocking:
+            blocked = np.ones(scores.shape, dtype=bool)
+            for r, row_candidates in enumerate(candidates):
+                blocked[r, np.searchsorted(columns, row_candidates)] = False
+            scores[blocked] = -np.inf
+        return columns, scores
+
+    def match_all(self, csv_rows: Iterable[Dict], one_to_one: bool = False) -> Iterator[tuple[Dict | None, float]]:
+        """
+        The parsed row that best matches each of `csv_rows` and its score, or (None, 0) if none score
+        above 0. Of rows with the same score, the first wins.
+
+        With `one_to_one`, no parsed row is matched to more than one CSV row: of the
+        `assignment_candidates` best-scoring rows for each CSV row, the rows are assigned so that the
+        sum of the scores of every match is highest, leaving CSV rows that lose all of theirs unmatched.
+        """
+        csv_rows = iter(csv_rows)
+        chunk_size = max(self.chunk_scores // max(len(self.rows), 1), 1)
+        edges = []
+        while chunk := [from_csv(row) for row in islice(csv_rows, chunk_size)]:
+            columns, scores = self.scores(chunk)
+            if not len(columns):
+                scores = np.zeros((len(chunk), 1))
+            if one_to_one:
+                best = np.argsort(-scores, axis=1, kind="stable")[:, : self.assignment_candidates]
+                edges.append((columns[best] if len(columns) else best, np.take_along_axis(scores, best, axis=1)))
+                continue
+            best = scores.argmax(axis=1)
+            for column, score in zip(best.tolist(), scores[np.arange(len(chunk)), best].tolist()):
+                yield (self.rows[columns[column]], score) if score > 0 else (None, 0)
+        if one_to_one:
+            yield from self.__assign(edges)
+
+    def __assign(self, edges: list[tuple[np.ndarray, np.ndarray]]) -> Iterator[tuple[Dict | None, float]]:
+        if not edges:
+            return
+        # SciPy takes a while to import, and is only needed here
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+        columns = np.concatenate([c for c, _ in edges])
+        scores = np.concatenate([s for _, s in edges])
+        n, m = len(scores), len(self.rows)
+        rows, ranks = np.nonzero(scores > 0)
+        # every CSV row gets a stand-in parsed row of its own, costing as much as a match scoring 0, so
+        # there is always a full assignment; real matches cost less the higher they score
+        matches = dict(zip(zip(rows.tolist(), columns[rows, ranks].tolist()), scores[rows, ranks].tolist()))
+        graph = csr_matrix(
+            (
+                np.concatenate([101 - scores[rows, ranks], np.full(n, 101.0)]),
+                (np.concatenate([rows, np.arange(n)]), np.concatenate([columns[rows, ranks], m + np.arange(n)])),
+            ),
+            shape=(n, m + n),
+        )
+        matched_rows, matched_columns = min_weight_full_bipartite_matching(graph)
+        assigned = dict(zip(matched_rows.tolist(), matched_columns.tolist()))
+        for r in range(n):
+            column = assigned[r]
+            yield (self.rows[column], matches[r, column]) if column < m else (None, 0)
+
+    def best_match(self, csv_row: Dict) -> tuple[Dict | None, float]:
+        """
+        The parsed row that best matches `csv_row` and its score, or (None, 0) if none score above 0.
+        """
+        return next(self.match_all([csv_row]))
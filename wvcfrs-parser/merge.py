@@ -1,26 +1,45 @@
+from __future__ import annotations
 import argparse
 from datetime import datetime
-import pytz
 import io
+import os
 from re import sub
-import requests
-import urllib.parse
 from tqdm import tqdm
 from parse import ContributionsOver250Parser, read_pdf_bytes
 import csv
-from typing import List, Dict
-from prompt_toolkit.shortcuts import radiolist_dialog, input_dialog, message_dialog
+from typing import Dict, Iterator, List
+import imports
 
 
-from fuzzywuzzy import fuzz
-from sentence_transformers import SentenceTransformer
-import numpy as np
+# loaded on first use, so `--help` doesn't wait on them
+bulk = imports.lazy("bulk")
+cfrs = imports.lazy("cfrs")
+embeddings = imports.lazy("embeddings")
+matching = imports.lazy("matching")
+pytz = imports.lazy("pytz")
 
 
-__cfrs_api_host = "https://cfrs.wvsos.gov"
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# the CFRS API client every request goes through, see `client`
+__client = None
+
+
+def client() -> cfrs.CFRSClient:
+    """
+    The CFRS API client, as configured by `configure` (or with the defaults, if it never was).
+    """
+    global __client
+    if __client is None:
+        __client = cfrs.CFRSClient()
+    return __client
+
+
+def configure(base_url: str = "https://cfrs.wvsos.gov", cache: str = None):
+    global __client
+    __client = cfrs.CFRSClient(base_url, cache)
 
 def get_name() -> str:
+    from prompt_toolkit.shortcuts import input_dialog
+
     return input_dialog(
         title="Enter candidate name",
         text="Please enter the name of the candidate you are searching for:",
@@ -28,16 +47,12 @@ def get_name() -> str:
 
 
 def search_candidate(name: str) -> List[Dict]:
-    name = urllib.parse.quote_plus(name.strip())
-    response = requests.get(
-        f"{__cfrs_api_host}/CFIS_APIService/api/Search/GetPublicSiteBasicSearchResult?searchText={name}&searchType=ALL&pageNumber=1&pageSize=50",
-        verify=False,
-    )
-    response.raise_for_status()
-    return response.json().get("CandidateInformationslist", [])
+    return client().search_candidates(name)
 
 
 def select_candidate(candidates: List[Dict]) -> Dict:
+    from prompt_toolkit.shortcuts import radiolist_dialog
+
     selected = radiolist_dialog(
         title="Select a candidate",
         text="Choose a candidate from the list:",
@@ -60,27 +75,11 @@ def select_candidate(candidates: List[Dict]) -> Dict:
 
 
 def get_candidate_info(candidate_id: int) -> Dict:
-    response = requests.get(
-        f"{__cfrs_api_host}/CFIS_APIService/api/Organization/GetCandidatesInformation?memberId={candidate_id}",
-        verify=False,
-    )
-    response.raise_for_status()
-    return response.json()
+    return client().candidate_info(candidate_id)
 
 
 def get_candidate_filings(candidate: Dict) -> List[Dict]:
-    cid = candidate["IDNumber"]
-    oid = candidate["OfficeId"]
-    yr = candidate["ElectionYear"]
-    did = candidate["DistrictId"]
-    eid = candidate["ElectionId"]
-
-    response = requests.get(
-        f"https://cfrs.wvsos.gov/CFIS_APIService/api/Filing/GetFilings?officeID={oid}&committeeID={cid}&electionYear={yr}&districtId={did}&electionId={eid}&pageNumber=1&pageSize=50",
-        verify=False,
-    )
-    response.raise_for_status()
-    return response.json()
+    return client().candidate_filings(candidate)
 
 
 def timestr_to_local(timestr: str) -> str:
@@ -95,6 +94,8 @@ def timestr_to_local(timestr: str) -> str:
 
 
 def select_filing(filings: List[Dict]) -> Dict:
+    from prompt_toolkit.shortcuts import radiolist_dialog
+
     selected = radiolist_dialog(
         title="Select a filing",
         text="Choose a filing from the list:",
@@ -110,69 +111,41 @@ def select_filing(filings: List[Dict]) -> Dict:
     return next((f for f in filings if f["ReportFileName"] == selected), None)
 
 def fetch_report(report_filename: str) -> io.BytesIO:
-    response = requests.get(
-        f"{__cfrs_api_host}/CFIS_APIService/ReportsOutput/{report_filename.strip()}",
-        verify=False,
-    )
-    response.raise_for_status()
-    return io.BytesIO(response.content)
-
-def get_all_con_csv(year : int) -> List[Dict]:
-    response = requests.get(
-        f"https://cfrs.wvsos.gov/CFIS_APIService/api/DataDownload/GetCSVDownloadReport?year={year}&transactionType=CON&reportFormat=csv&fileName=CON_{year}.csv",
-        verify=False,
-    )
-    response.raise_for_status()
-    csvreader = csv.DictReader(io.StringIO(response.text))
-    return list(csvreader)
-
-def find_best_match(csv_row, db_rows):
-    best_match = None
-    highest_score = 0
-
-    for db_row in db_rows:
-        # Fuzzy match for name
-        csv_name = csv_row['Last Name'] if csv_row['Middle Name'].strip() + csv_row['Suffix'].strip() != 0 else f"{csv_row['First Name']} {csv_row['Last Name']}"
-        name_score = fuzz.ratio(csv_name.upper(), db_row['name'].upper())
-
-        # Fuzzy match for employer/occupation
-        csv_emp = (
-            "" if any([csv_row['Employer'] is None, csv_row['Employer'] == ""]) else
-            csv_row['Employer'] if csv_row['Occupation'] == "Other" else f"{csv_row['Employer']} {csv_row['Occupation']}"
-        )
-
-        db_emp = (
-            "" if db_row['employer_occupation'] is None else
-            "RETIRED" if db_row['employer_occupation'] == "RETIRED RETIRED" else db_row['employer_occupation']
-        )
+    return io.BytesIO(client().report(report_filename))
 
-        employer_occupation_score = fuzz.ratio(csv_emp.upper(), db_emp.upper())
-
-        # Date comparison
-        csv_date = datetime.strptime(csv_row['Receipt Date'], '%m/%d/%Y %I:%M:%S %p')
-        db_date = datetime.strptime(db_row['date'], '%m/%d/%Y')  # Adjust format if needed
-        date_diff = abs((csv_date - db_date).days)
-        date_score = 100 if date_diff == 0 else max(0, 100 - date_diff * 5)  # 20 points off for each day difference
-
-        # Amount comparison
-        csv_amount = float(csv_row['Receipt Amount'])
-        db_amount = float(db_row['amount'])
-        amount_diff = abs(csv_amount - db_amount)
-        amount_score = 100 if amount_diff == 0 else max(0, 100 - amount_diff * 10)  # 10 points off for each dollar difference
-
-        # Combine scores (adjust weights as needed)
-        total_score = (
-            0.5 * name_score + 
-            0.1 * employer_occupation_score + 
-            0.2 * date_score + 
-            0.2 * amount_score
-        )
+def get_all_con_csv(year : int) -> Iterator[Dict]:
+    """
+    The rows of the year's bulk contributions CSV download, streamed from disk rather than read into memory.
+    """
+    return client().contributions_csv(year)
 
-        if total_score > highest_score:
-            highest_score = total_score
-            best_match = db_row
+def get_candidate_con(candidate: Dict, report_name: str = None, store: str = None, refresh: bool = False) -> List[Dict]:
+    """
+    The candidate's rows of the bulk contributions CSV download for its election year, only those of the
+    report named `report_name` if given. With a `store` file, the year's download is loaded into a local
+    `bulk.ContributionStore` the first time (or every time, with `refresh`) and the rows are looked up in it.
+    """
+    year = candidate["ElectionYear"]
+    if store is None:
+        return [
+            row for row in get_all_con_csv(year)
+            if int(row["OrgID"]) == candidate["IDNumber"] and report_name in (None, row["Report Name"])
+        ]
+    contributions = bulk.ContributionStore(store)
+    try:
+        if refresh or not contributions.loaded(year):
+            print(f"Loading the {year} bulk contributions download into {store}")
+            contributions.load(year, tqdm(get_all_con_csv(year), desc="Loading rows...", unit="row"))
+        return contributions.rows(year, candidate["IDNumber"], report_name)
+    finally:
+        contributions.close()
 
-    return best_match, highest_score
+def find_best_match(csv_row, db_rows):
+    """
+    The row of `db_rows` that best matches `csv_row`, and its score, comparing it against every row. To
+    match many CSV rows against the same parsed rows, use a `matching.Matcher` instead.
+    """
+    return matching.Matcher(db_rows, blocking=False).best_match(csv_row)
 
 def main():
     argparser = argparse.ArgumentParser(
@@ -181,7 +154,46 @@ def main():
     argparser.add_argument("--name", type=str, help="Name of the candidate to search for")
     argparser.add_argument("--output", type=str, help="Output file (.csv) of merged data to write")
     argparser.add_argument("--database", type=str, help="Path to the SQLite database file")
+    argparser.add_argument(
+        "--one-to-one",
+        action="store_true",
+        help="Match each parsed row to at most one bulk CSV row, maximizing the total score of all matches",
+    )
+    argparser.add_argument(
+        "--semantic-model",
+        type=str,
+        help="Local directory of a Sentence Transformers model (e.g. all-MiniLM-L6-v2) to find candidate matches with by meaning",
+    )
+    argparser.add_argument(
+        "--embedding-cache",
+        type=str,
+        help="SQLite file to cache embeddings in with --semantic-model, so text isn't encoded again on later runs",
+    )
+    argparser.add_argument(
+        "--api-url",
+        type=str,
+        help="Base URL of the CFRS API",
+        default="https://cfrs.wvsos.gov",
+    )
+    argparser.add_argument(
+        "--http-cache",
+        type=str,
+        help="Directory to cache API responses (bulk CSV downloads, report PDFs) in, so they're only downloaded again when they change",
+    )
+    argparser.add_argument(
+        "--con-store",
+        type=str,
+        help="SQLite file to load the bulk contributions CSV download of each year into once, and look candidates up in",
+    )
+    argparser.add_argument(
+        "--refresh-con",
+        action="store_true",
+        help="Load the bulk contributions CSV download into --con-store again, even if it already holds that year",
+    )
     args = argparser.parse_args()
+    from prompt_toolkit.shortcuts import message_dialog
+
+    configure(args.api_url, args.http_cache)
 
     candidate_name = (args.name if args.name else get_name()).strip()
 
@@ -200,10 +212,7 @@ def main():
 
     # if we've already parsed the data, use the results of that
     if args.database:
-        candidate_con = [
-            row for row in get_all_con_csv(candidate["ElectionYear"]) 
-            if int(row["OrgID"]) == candidate["IDNumber"]
-        ]
+        candidate_con = get_candidate_con(candidate, store=args.con_store, refresh=args.refresh_con)
         import sqlite3
         conn = sqlite3.connect(args.database)
         conn.row_factory = sqlite3.Row
@@ -222,18 +231,22 @@ def main():
             return
 
         filing = select_filing(candidate_filings)
-        candidate_con = [
-            row for row in get_all_con_csv(candidate["ElectionYear"]) 
-            if int(row["OrgID"]) == candidate["IDNumber"] and row["Report Name"] == filing["ReportName"]
-        ]
+        candidate_con = get_candidate_con(
+            candidate, filing["ReportName"], store=args.con_store, refresh=args.refresh_con
+        )
         filing_pdf = fetch_report(filing["ReportFileName"])
-        data = read_pdf_bytes(filing_pdf)
+        data = read_pdf_bytes(filing_pdf.getvalue())
         parsed_data = ContributionsOver250Parser().parse_all(data)
         print("from api")
 
+    encoder = None
+    if args.semantic_model:
+        model = os.path.basename(os.path.normpath(args.semantic_model))
+        cache = embeddings.EmbeddingCache(args.embedding_cache, model) if args.embedding_cache else None
+        encoder = embeddings.Encoder(args.semantic_model, cache)
+    matches = matching.Matcher(parsed_data, encoder=encoder).match_all(candidate_con, one_to_one=args.one_to_one)
     # for every row in the bulk CSV download ...
-    for row_csv in tqdm(candidate_con, desc="Merging data...", unit="row"):
-        match, _ = find_best_match(row_csv, parsed_data)
+    for row_csv, (match, _) in tqdm(zip(candidate_con, matches), total=len(candidate_con), desc="Merging data...", unit="row"):
         if match:
             print(f"Matched {row_csv['Last Name']} ({row_csv['Receipt Date'].split(' ')[0]}) {row_csv['Receipt Amount']} to {match['name']} ({match['date']}) {match['amount']}")
             # merged_data.append({
@@ -0,0 +1,152 @@
+import json
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# time spent in each stage of the pipeline in this process, as "<stage> seconds", and how many times
+# it ran, as "<stage> calls"; pages read in worker processes are added in with `merge`. The names can't
+# be mistaken for those of `ocr.counters`, which worker processes return alongside them.
+counters: Counter = Counter()
+
+# the stages timed, in the order a page goes through them
+stages = ["page", "rasterize", "text_layer", "threshold", "grid", "tesseract", "parse", "write"]
+
+
+@contextmanager
+def timer(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        counters[f"{stage} seconds"] += time.perf_counter() - start
+        counters[f"{stage} calls"] += 1
+
+
+def timed(stage: str):
+    """
+    Decorates a function so every call to it is timed as `stage`.
+    """
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def timings(counts: Counter) -> Counter:
+    """
+    The stage timings among `counts` (e.g. the counts a worker process returned for a page).
+    """
+    return Counter({name: value for name, value in counts.items() if name.endswith((" seconds", " calls"))})
+
+
+def merge(counts: Counter):
+    """
+    Adds the stage timings among `counts`, of work done in another process, to `counters`.
+    """
+    counters.update(timings(counts))
+
+
+def peak_rss() -> dict[str, int]:
+    """
+    The peak resident set size, in bytes, of this process and of the largest of its child processes
+    (worker processes, tesseract and poppler) that have exited.
+    """
+    if resource is None:
+        return {}
+    # kilobytes on Linux, bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "main": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit,
+    }
+
+
+def report(ocr_counts: Counter = None, wall_seconds: float = None) -> dict:
+    """
+    The profile of a run: the time spent in, and calls made to, each stage (summed over every process,
+    so it can add up to more than `wall_seconds` with several workers), the `ocr.counters` totals of
+    the pages read, the average number of table cells on a page and peak memory use.
+    """
+    ocr_counts = ocr_counts or Counter()
+    names = [*stages, *sorted({name.rsplit(" ", 1)[0] for name in timings(counters)} - set(stages))]
+    pages = counters["page calls"]
+    return {
+        "wall_seconds": wall_seconds,
+        "stages": {
+            name: {"seconds": counters[f"{name} seconds"], "calls": counters[f"{name} calls"]}
+            for name in names
+            if counters[f"{name} calls"]
+        },
+        "ocr": {name: ocr_counts[name] for name in ["cells", "blank_cells", "blank_rows", "ocr_calls"]},
+        "pages": pages,
+        "cells_per_page": ocr_counts["cells"] / pages if pages else None,
+        "peak_rss_bytes": peak_rss(),
+    }
+
+
+def prometheus_text(profile: dict, prefix: str = "wvcfrs") -> str:
+    """
+    `profile` (see `report`) in the Prometheus text exposition format, e.g. for node_exporter's
+    textfile collector.
+    """
+    lines = []
+
+    def metric(name: str, type: str, help: str, samples: list[tuple[dict, float]]):
+        lines.append(f"# HELP {prefix}_{name} {help}")
+        lines.append(f"# TYPE {prefix}_{name} {type}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f"{prefix}_{name}{{{label_text}}} {value}" if labels else f"{prefix}_{name} {value}")
+
+    stage_items = profile["stages"].items()
+    metric(
+        "stage_seconds_total",
+        "counter",
+        "Time spent in each stage, summed over every process",
+        [({"stage": name}, stage["seconds"]) for name, stage in stage_items],
+    )
+    metric(
+        "stage_calls_total",
+        "counter",
+        "Number of times each stage ran",
+        [({"stage": name}, stage["calls"]) for name, stage in stage_items],
+    )
+    metric("pages_total", "counter", "Pages read", [({}, profile["pages"])])
+    for name, value in profile["ocr"].items():
+        metric(f"{name}_total", "counter", f"OCR {name.replace('_', ' ')}", [({}, value)])
+    if profile["cells_per_page"] is not None:
+        metric("cells_per_page", "gauge", "Average number of table cells on a page", [({}, profile["cells_per_page"])])
+    if profile["wall_seconds"] is not None:
+        metric("wall_seconds", "gauge", "Wall clock time of the run", [({}, profile["wall_seconds"])])
+    metric(
+        "peak_rss_bytes",
+        "gauge",
+        "Peak resident set size",
+        [({"process": process}, value) for process, value in profile["peak_rss_bytes"].items()],
+    )
+    return "\n".join(lines) + "\n"
+
+
+def write_report(profile: dict, json_path: str = None, prometheus_path: str = None):
+    """
+    Writes `profile` (see `report`) to `json_path` as JSON and to `prometheus_path` as Prometheus text.
+    """
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(profile, f, indent=2)
+    if prometheus_path:
+        with open(prometheus_path, "w") as f:
+            f.write(prometheus_text(profile))
@@ -0,0 +1,390 @@
+import cv2
+import hashlib
+import numpy as np
+import pytesseract
+import re
+import shlex
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+from typing import List
+import metrics
+
+# vertical padding between cells tiled into one composite image; tall enough that tesseract never
+# merges the last line of one cell with the first line of the next
+__tile_gap = 40
+
+# work done by OCR in this process: "cells" seen, "blank_cells" and "blank_rows" that were skipped
+# without running tesseract, and the tesseract "ocr_calls" that were made; see `parse._process_page`
+counters: Counter = Counter()
+
+
+class OCRBackend(ABC):
+    """
+    A text recognition engine. `config` is a tesseract command line config string, like the ones passed
+    to `pytesseract`, so every backend accepts the same whitelist/psm settings.
+    """
+
+    @abstractmethod
+    def image_to_string(self, image: np.ndarray, config: str = "") -> str:
+        pass
+
+    @abstractmethod
+    def image_to_data(self, image: np.ndarray, config: str = "") -> dict[str, list]:
+        """
+        Word-level results in the same shape as `pytesseract.image_to_data(..., output_type=Output.DICT)`.
+        """
+        pass
+
+
+class PytesseractBackend(OCRBackend):
+    """
+    Shells out to the `tesseract` binary for every call.
+    """
+
+    def image_to_string(self, image, config=""):
+        return pytesseract.image_to_string(image, config=config)
+
+    def image_to_data(self, image, config=""):
+        return pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+
+
+class TesserocrBackend(OCRBackend):
+    """
+    Runs tesseract in-process through libtesseract (`tesserocr`), keeping one initialized engine per
+    distinct config alive for the life of the process so the model is only loaded once per worker.
+    """
+
+    __tsv_columns = [
+        "level", "page_num", "block_num", "par_num", "line_num", "word_num",
+        "left", "top", "width", "height", "conf", "text",
+    ]
+
+    def __init__(self, lang: str = "eng"):
+        import tesserocr
+
+        self.tesserocr = tesserocr
+        self.lang = lang
+        self.apis = {}
+
+    def __del__(self):
+        for api in self.apis.values():
+            api.End()
+
+    def api(self, config: str):
+        if config not in self.apis:
+            oem, psm, variables = self.tesserocr.OEM.DEFAULT, self.tesserocr.PSM.AUTO, {}
+            args = iter(shlex.split(config))
+            for arg in args:
+                if arg == "--oem":
+                    oem = int(next(args))
+                elif arg == "--psm":
+                    psm = int(next(args))
+                elif arg == "-c":
+                    key, value = next(args).split("=", 1)
+                    variables[key] = value
+            api = self.tesserocr.PyTessBaseAPI(lang=self.lang, oem=oem, psm=psm)
+            for key, value in variables.items():
+                api.SetVariable(key, value)
+            self.apis[config] = api
+        return self.apis[config]
+
+    def set_image(self, image, config):
+        from PIL import Image
+
+        api = self.api(config)
+        api.SetImage(Image.fromarray(image) if isinstance(image, np.ndarray) else image)
+        return api
+
+    def image_to_string(self, image, config=""):
+        return self.set_image(image, config).GetUTF8Text()
+
+    def image_to_data(self, image, config=""):
+        data = {column: [] for column in self.__tsv_columns}
+        for line in self.set_image(image, config).GetTSVText(0).splitlines():
+            values = line.split("\t", len(self.__tsv_columns) - 1)
+            if len(values) < len(self.__tsv_columns):
+                values.append("")
+            for column, value in zip(self.__tsv_columns, values):
+                data[column].append(value if column == "text" else int(float(value)))
+        return data
+
+
+backends: dict[str, type[OCRBackend]] = {
+    "pytesseract": PytesseractBackend,
+    "tesserocr": TesserocrBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def get_backend(name: str = "pytesseract") -> OCRBackend:
+    """
+    Returns this process's instance of the named backend, creating it on first use.
+    """
+    return backends[name]()
+
+
+class OCRCache:
+    """
+    An on-disk, size-bounded LRU store of OCR results in SQLite, keyed by a hash of the cell's pixels,
+    the OCR config and the backend. Safe to share between worker processes: the object pickles to just
+    its path and size, and each process opens its own connection on first use. Hit/miss counts are kept
+    in the database so they add up across processes. New entries, last-used times and counts are held in
+    memory until `commit`, so a process only takes the database's write lock for one short transaction
+    rather than for as long as it OCRs a page.
+    """
+
+    # approximate per-entry overhead (key, index and row headers) counted against `max_bytes`
+    __entry_overhead = 96
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.conn = None
+        self.touched: dict[str, float] = {}
+        self.added: dict[str, tuple[str, float]] = {}
+        self.counts = {"hits": 0, "misses": 0}
+
+    def __getstate__(self):
+        return {"path": self.path, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["max_bytes"])
+
+    def connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, timeout=60)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ocr_cache_last_used ON ocr_cache (last_used);
+            CREATE TABLE IF NOT EXISTS ocr_cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            """)
+        return self.conn
+
+    @staticmethod
+    def key(image: np.ndarray, config: str, backend: OCRBackend) -> str:
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{type(backend).__name__}|{config}|{image.shape}|{image.dtype}".encode())
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        if key in self.added:
+            self.counts["hits"] += 1
+            return self.added[key][0]
+        row = self.connect().execute("SELECT text FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.counts["misses"] += 1
+            return None
+        self.counts["hits"] += 1
+        self.touched[key] = time.time()
+        return row[0]
+
+    def put(self, key: str, text: str):
+        self.added[key] = (text, time.time())
+
+    def __add_stat(self, name: str, value: int):
+        self.connect().execute(
+            "INSERT INTO ocr_cache_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+            (name, value),
+        )
+
+    def commit(self):
+        """
+        Writes pending entries, last-used times and hit/miss counts in one transaction, evicting the least
+        recently used entries if the cache has grown past `max_bytes`.
+        """
+        conn = self.connect()
+        added = 0
+        for key, (text, used) in self.added.items():
+            size = len(key) + len(text.encode()) + self.__entry_overhead
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO ocr_cache (key, text, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, text, size, used),
+            )
+            added += size if cursor.rowcount else 0
+        self.__add_stat("bytes", added)
+        conn.executemany(
+            "UPDATE ocr_cache SET last_used = ? WHERE key = ?",
+            [(used, key) for key, used in self.touched.items()],
+        )
+        for name, value in self.counts.items():
+            self.__add_stat(name, value)
+        self.touched.clear()
+        self.added.clear()
+        self.counts = {"hits": 0, "misses": 0}
+
+        size = self.stats().get("bytes", 0)
+        if size > self.max_bytes:
+            # evict down to 90% of the limit so we aren't evicting again on the very next commit
+            excess = size - int(self.max_bytes * 0.9)
+            evicted = conn.execute(
+                """
+                DELETE FROM ocr_cache WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, size, SUM(size) OVER (ORDER BY last_used, key) AS running
+                        FROM ocr_cache
+                    ) WHERE running - size < ?
+                ) RETURNING size
+                """,
+                (excess,),
+            ).fetchall()
+            self.__add_stat("bytes", -sum(row[0] for row in evicted))
+            self.__add_stat("evictions", len(evicted))
+        conn.commit()
+
+    def stats(self) -> dict[str, int]:
+        return dict(self.connect().execute("SELECT name, value FROM ocr_cache_stats").fetchall())
+
+
+def upscale(cell: np.ndarray, scale_percent: int = 200) -> np.ndarray:
+    width = int(cell.shape[1] * scale_percent / 100)
+    height = int(cell.shape[0] * scale_percent / 100)
+    return cv2.resize(cell, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def is_blank(cell: np.ndarray, dpi: int = 200) -> bool:
+    """
+    Whether a thresholded cell has too little ink to hold any text, ignoring a thin margin along its
+    edges where the table's rules bleed in.
+    """
+    margin = max(round(3 * dpi / 200), 1)
+    interior = cell[margin:-margin, margin:-margin]
+    # about a third of the ink of the smallest glyph (a period or a "1") at 200 DPI
+    return interior.size == 0 or cv2.countNonZero(interior) < 20 * (dpi / 200) ** 2
+
+
+def ocr_cell(cell: np.ndarray, config: str, backend: OCRBackend) -> str:
+    if cell.size == 0:
+        return ""
+    return backend.image_to_string(cell, config).strip()
+
+
+def tile_cells(cells: List[np.ndarray]) -> tuple[np.ndarray, list[int]]:
+    """
+    Stacks `cells` top to bottom into a single image (on the same black background as the thresholded
+    page), returning it along with the y offset each cell was placed at.
+    """
+    width = max(cell.shape[1] for cell in cells)
+    height = sum(cell.shape[0] for cell in cells) + __tile_gap * (len(cells) + 1)
+    composite = np.zeros((height, width), dtype=cells[0].dtype)
+
+    offsets = []
+    y = __tile_gap
+    for cell in cells:
+        composite[y : y + cell.shape[0], 0 : cell.shape[1]] = cell
+        offsets.append(y)
+        y += cell.shape[0] + __tile_gap
+    return composite, offsets
+
+
+def ocr_cells(cells: List[np.ndarray], config: str, backend: OCRBackend) -> list[str]:
+    """
+    OCRs all of `cells` with a single tesseract invocation by tiling them into one composite image and
+    mapping each recognized word back to the cell it was placed in, by the word's vertical center.
+    """
+    texts = [""] * len(cells)
+    tiles = [i for i, cell in enumerate(cells) if cell.size > 0]
+    if not tiles:
+        return texts
+
+    composite, offsets = tile_cells([cells[i] for i in tiles])
+    data = backend.image_to_data(composite, config)
+
+    lines: dict[int, dict[tuple[int, int, int], list[str]]] = {}
+    for i, word in enumerate(data["text"]):
+        if int(data["level"][i]) != 5 or not word.strip():
+            continue
+        center = data["top"][i] + data["height"][i] / 2
+        tile = max(bisect_right(offsets, center) - 1, 0)
+        line = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(tile, {}).setdefault(line, []).append(word.strip())
+
+    for tile, tile_lines in lines.items():
+        texts[tiles[tile]] = "\n".join(" ".join(words) for words in tile_lines.values())
+    return texts
+
+
+def tiled_config(config: str) -> str:
+    """
+    `config` for reading cells tiled on top of each other (see `tile_cells`): a single-line page
+    segmentation mode would read the whole stack as one line, so it is swapped for a uniform block.
+    """
+    return re.sub(r"--psm\s+(7|8|10|13)\b", "--psm 6", config)
+
+
+def ocr_rows(
+    rows: List[List[np.ndarray]],
+    config: str,
+    backend: OCRBackend,
+    batch: str = "cell",
+    cache: OCRCache = None,
+    column_configs: dict[int, str] = None,
+) -> list[list[str]]:
+    """
+    OCRs the cell images of each row, either one tesseract call per cell (`batch="cell"`), one per
+    row (`batch="row"`) or one for every cell on the page (`batch="page"`). Empty cell images (blank
+    cells, see `is_blank`) are "" without being OCR'd. With a `cache`, cells that have been OCR'd
+    before are looked up instead, and only the rest are sent to tesseract.
+
+    Cells are read with `config`, except for the columns in `column_configs` (by index, negative
+    indices counting from the end of the row), which are read with their own; cells with different
+    configs are never batched into the same call.
+    """
+    column_configs = column_configs or {}
+    configs = [
+        [column_configs.get(c, column_configs.get(c - len(row), config)) for c in range(len(row))] for row in rows
+    ]
+    texts: list[list[str | None]] = [["" if cell.size == 0 else None for cell in row] for row in rows]
+    counters["cells"] += sum(len(row) for row in rows)
+    counters["blank_cells"] += sum(text == "" for row in texts for text in row)
+    keys = {}
+    if cache is not None:
+        for r, row in enumerate(rows):
+            for c, cell in enumerate(row):
+                if texts[r][c] is None:
+                    keys[r, c] = cache.key(cell, configs[r][c], backend)
+                    texts[r][c] = cache.get(keys[r, c])
+
+    misses = [(r, c) for r, row in enumerate(texts) for c, text in enumerate(row) if text is None]
+    batches: dict[tuple, list[tuple[int, int]]] = {}
+    for r, c in misses:
+        if batch == "page":
+            group = (configs[r][c],)
+        elif batch == "row":
+            group = (r, configs[r][c])
+        else:
+            group = (r, c)
+        batches.setdefault(group, []).append((r, c))
+
+    counters["ocr_calls"] += len(batches)
+    for cells in batches.values():
+        images = [rows[r][c] for r, c in cells]
+        config = configs[cells[0][0]][cells[0][1]]
+        with metrics.timer("tesseract"):
+            if batch == "cell":
+                results = [ocr_cell(images[0], config, backend)]
+            else:
+                results = ocr_cells(images, tiled_config(config), backend)
+        for (r, c), text in zip(cells, results):
+            texts[r][c] = text
+            if cache is not None:
+                cache.put(keys[r, c], text)
+
+    if cache is not None:
+        cache.commit()
+    return texts
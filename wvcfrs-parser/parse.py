@@ -1,118 +1,609 @@
-from tkinter import Image
-import cv2
+from __future__ import annotations
 import argparse
-import pytesseract
-import numpy as np
-import sqlite3
+import hashlib
 import re
-from pdf2image import convert_from_path, convert_from_bytes
+import os
+import itertools
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import partial
 from tqdm import tqdm
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Sequence, TYPE_CHECKING
+import imports
+import metrics
+
+# loaded on first use, so `--help` doesn't wait on OpenCV, NumPy and pdf2image
+cv2 = imports.lazy("cv2")
+np = imports.lazy("numpy")
+db = imports.lazy("db")
+grid = imports.lazy("grid")
+ocr = imports.lazy("ocr")
+pdf = imports.lazy("pdf")
+sections = imports.lazy("sections")
+
+if TYPE_CHECKING:
+    from PIL.Image import Image
 
 __pytesseract_config = r"--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ,.\-\:\#\&\ \$\/\""
 
+# OCR settings for columns that only ever hold one kind of value on a single line, by name (see
+# `SectionParser.column_profiles`); "date" also allows the letters of the "DATE" column header, which
+# `SectionParser.iter_rows` relies on to drop header rows
+__ocr_profiles = {
+    "text": __pytesseract_config,
+    "date": r"--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789/DATE",
+    "amount": r"--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789$,.",
+}
+
 
-def process_image_cells(image) -> list[str]:
+@metrics.timed("threshold")
+def threshold_image(image) -> np.ndarray:
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    adaptive_thresh = cv2.adaptiveThreshold(
+    return cv2.adaptiveThreshold(
         gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 15, 4
     )
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (40, 1))
-    detect_horizontal = cv2.morphologyEx(
-        adaptive_thresh, cv2.MORPH_OPEN, horizontal_kernel, iterations=2
-    )
-    contours_horizontal, _ = cv2.findContours(
-        detect_horizontal, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-    )
-    contours_horizontal = sorted(
-        contours_horizontal, key=lambda ctr: cv2.boundingRect(ctr)[1]
+
+
+def find_cells(adaptive_thresh: np.ndarray, dpi: int = 200) -> list[list[tuple[int, int, int, int]]]:
+    """
+    Locates the table cells of a thresholded page from its ruling lines, returning the (x0, y0, x1, y1)
+    box of every cell, row by row from top to bottom and left to right within a row.
+    """
+    return grid.detect(adaptive_thresh, dpi).boxes()
+
+
+def _write_grid(image: np.ndarray, page_grid: grid.Grid, path: str | None):
+    if path:
+        cv2.imwrite(path, grid.draw(image, page_grid))
+
+
+def process_image_cells(
+    image,
+    batch: str = "cell",
+    backend: str = "pytesseract",
+    dpi: int = 200,
+    cache: ocr.OCRCache = None,
+    debug_path: str = None,
+    template: grid.ColumnTemplate = None,
+    column_profiles: dict[int, str] = None,
+) -> list[list[str]]:
+    adaptive_thresh = threshold_image(image)
+    page_grid = grid.detect(adaptive_thresh, dpi, template)
+    _write_grid(image, page_grid, debug_path)
+    row_cells = []
+    for cells in page_grid.boxes():
+        crops = [adaptive_thresh[y0:y1, x0:x1] for x0, y0, x1, y1 in cells]
+        blank = [ocr.is_blank(cell, dpi) for cell in crops]
+        # padding rows at the bottom of a page are skipped outright
+        if cells and all(blank):
+            ocr.counters["blank_rows"] += 1
+            continue
+        # blank cells are left empty, which `ocr.ocr_rows` reads as "" without OCR'ing them
+        row_cells.append([cell[:0, :0] if b else ocr.upscale(cell) for cell, b in zip(crops, blank)])
+    column_configs = {column: __ocr_profiles[name] for column, name in (column_profiles or {}).items()}
+    return ocr.ocr_rows(row_cells, __pytesseract_config, ocr.get_backend(backend), batch, cache, column_configs)
+
+
+def process_text_cells(
+    image, text_page: pdf.TextPage, debug_path: str = None, template: grid.ColumnTemplate = None
+) -> list[list[str]] | None:
+    """
+    Fills the table cells found on a rendered page with the words of its embedded text layer instead of
+    OCR'ing them. Returns None when none of the words land inside the table (e.g. a scanned page that
+    only carries a filing stamp as text), so the caller can fall back to OCR.
+    """
+    scale = image.shape[1] / text_page.width
+    page_grid = grid.detect(threshold_image(image), round(scale * 72), template)
+    _write_grid(image, page_grid, debug_path)
+    boxes = page_grid.boxes()
+    rows = [[{} for _ in cells] for cells in boxes]
+
+    placed = False
+    for word in text_page.words:
+        cx = (word.x0 + word.x1) / 2 * scale
+        cy = (word.y0 + word.y1) / 2 * scale
+        for r, cells in enumerate(boxes):
+            if not cells or not cells[0][1] <= cy < cells[0][3]:
+                continue
+            for c, (x0, _, x1, _) in enumerate(cells):
+                if x0 <= cx < x1:
+                    rows[r][c].setdefault(word.line, []).append(word.text)
+                    placed = True
+                    break
+            break
+
+    if not placed:
+        return None
+    return [["\n".join(" ".join(words) for words in lines.values()) for lines in row] for row in rows]
+
+
+def _read_page(
+    page: Image | pdf.PageRef,
+    text_page: pdf.TextPage | None = None,
+    batch: str = "cell",
+    backend: str = "pytesseract",
+    cache: ocr.OCRCache = None,
+    debug_grid: str = None,
+    template: grid.ColumnTemplate = None,
+    column_profiles: dict[int, str] = None,
+    image: Image = None,
+) -> list[list[str]]:
+    lazy = isinstance(page, pdf.PageRef)
+    # overlays are named after the page they're of, which only pages rendered from a PDF know
+    debug_path = os.path.join(debug_grid, f"page-{page.page:04d}.png") if debug_grid and lazy else None
+    # `image` is the page already rendered at `page.dpi`, which both ways of reading it can use
+    if image is None and not lazy:
+        image = page
+    if text_page:
+        text_image = image if image is not None else page.render(pdf.TEXT_LAYER_DPI)
+        rows = process_text_cells(cv2.cvtColor(np.array(text_image), cv2.COLOR_RGB2BGR), text_page, debug_path, template)
+        if rows is not None:
+            return rows
+    if image is None:
+        image = page.render()
+    return process_image_cells(
+        cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR),
+        batch,
+        backend,
+        page.dpi if lazy else 200,
+        cache,
+        debug_path,
+        template,
+        column_profiles,
     )
 
-    row_texts = []
-    try:
-        for i in range(len(contours_horizontal) - 1):
-            x1, y1, w1, h1 = cv2.boundingRect(contours_horizontal[i])
-            x2, y2, _, _ = cv2.boundingRect(contours_horizontal[i + 1])
 
-            row = adaptive_thresh[y1 + h1 : y2, 0 : image.shape[1]]
+def page_fingerprint(image: Image, dpi: int = 200) -> str:
+    """
+    A hash of the table on a rendered page: of the thresholded page between its first and last
+    horizontal rules (all of it when it has none), so a stamp added outside of the table to every page
+    of an amended filing doesn't set them apart from the pages of the original.
+    """
+    adaptive_thresh = threshold_image(cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR))
+    rows = grid.detect(adaptive_thresh, dpi).rows
+    if len(rows):
+        adaptive_thresh = adaptive_thresh[rows[0, 0] : rows[-1, 1]]
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{adaptive_thresh.shape}".encode())
+    digest.update(np.ascontiguousarray(adaptive_thresh).data)
+    return digest.hexdigest()
 
-            vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 40))
-            detect_vertical = cv2.morphologyEx(
-                row, cv2.MORPH_OPEN, vertical_kernel, iterations=2
-            )
-            contours_vertical, _ = cv2.findContours(
-                detect_vertical, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
-            )
-            contours_vertical = sorted(
-                contours_vertical, key=lambda ctr: cv2.boundingRect(ctr)[0]
-            )
 
-            cell_texts = []
-            for j in range(len(contours_vertical) - 1):
-                x1, y1, w1, h1 = cv2.boundingRect(contours_vertical[j])
-                x2, y2, _, _ = cv2.boundingRect(contours_vertical[j + 1])
-                cell = row[:, x1 + w1 : x2]
-
-                scale_percent = 200
-                width = int(cell.shape[1] * scale_percent / 100)
-                height = int(cell.shape[0] * scale_percent / 100)
-                dim = (width, height)
-                resized_cell = cv2.resize(cell, dim, interpolation=cv2.INTER_LINEAR)
-
-                text = pytesseract.image_to_string(
-                    resized_cell,
-                    config=__pytesseract_config,
-                )
-                cell_texts.append(text.strip())
+def _process_page(
+    page: Image | pdf.PageRef, *args, known: set[str] = None, **kwargs
+) -> tuple[list[list[str]] | None, Counter, str | None]:
+    """
+    The rows of a page (see `_read_page`), along with what reading it added to `ocr.counters` and
+    `metrics.counters`, so the counts of every worker process can be totalled. With a set of `known`
+    page fingerprints, the page's fingerprint (see `page_fingerprint`, of the page rendered at its
+    `dpi`, which the page is then read from rather than rendered again) comes with them, and a page
+    whose fingerprint is in `known` isn't read at all: its rows are None.
+    """
+    before, timings = ocr.counters.copy(), metrics.counters.copy()
+    rows, fingerprint, image = None, None, None
+    with metrics.timer("page"):
+        if known is not None:
+            if isinstance(page, pdf.PageRef):
+                image = page.render()
+                fingerprint = page_fingerprint(image, page.dpi)
+            else:
+                fingerprint = page_fingerprint(page)
+        if fingerprint is None or fingerprint not in known:
+            rows = _read_page(page, *args, image=image, **kwargs)
+    return rows, (ocr.counters - before) + (metrics.counters - timings), fingerprint
 
-            row_texts.append(cell_texts)
+
+def _page_failed(page, error: str):
+    print(f"Error processing page {page}: {error}")
+    return [], Counter(), None
+
+
+def _restart_pool(executor: ProcessPoolExecutor, workers: int) -> ProcessPoolExecutor:
+    executor.shutdown(wait=False, cancel_futures=True)
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def _resubmit(pending: deque, executor: ProcessPoolExecutor, process_page):
+    """
+    Submits the `pending` pages to `executor` again after their pool broke, apart from those that were
+    done before it did.
+    """
+    for i, (page, args, future) in enumerate(pending):
+        if not future.done() or future.cancelled() or future.exception() is not None:
+            pending[i] = (page, args, executor.submit(process_page, *args))
+
+
+def _submit_page(
+    pending: deque, executor: ProcessPoolExecutor, workers: int, process_page, page, args: tuple
+) -> ProcessPoolExecutor:
+    """
+    Submits `page` to `executor`, appending it to `pending`, and returns the pool to submit pages to from
+    now on. A worker can crash after the last page was collected, breaking the pool for every page in
+    flight; they're then submitted again, with `page`, to a fresh pool.
+    """
+    try:
+        future = executor.submit(process_page, *args)
+    except BrokenProcessPool:
+        executor = _restart_pool(executor, workers)
+        _resubmit(pending, executor, process_page)
+        future = executor.submit(process_page, *args)
+    pending.append((page, args, future))
+    return executor
+
+
+def _collect_page(pending: deque, executor: ProcessPoolExecutor, workers: int, process_page, failed=_page_failed):
+    """
+    The result of the first of the `pending` (page, args, future) triples, and the pool to submit pages
+    to from now on. A page that fails, or crashes its worker, is passed to `failed` along with the error,
+    and its result is whatever that returns (by default, the error is reported and the page has no
+    rows).
+    """
+    page, args, future = pending.popleft()
+    try:
+        return future.result(), executor
+    except BrokenProcessPool:
+        # a worker died (e.g. segfault in tesseract/opencv), which fails every in-flight page;
+        # re-run this page alone in a fresh pool to tell the culprit apart from the rest of the window
+        executor = _restart_pool(executor, workers)
+        try:
+            result = executor.submit(process_page, *args).result()
+        except BrokenProcessPool:
+            result = failed(page, "worker process crashed")
+            executor = _restart_pool(executor, workers)
+        except Exception as e:
+            result = failed(page, str(e))
+        _resubmit(pending, executor, process_page)
+        return result, executor
     except Exception as e:
-        print(f"Error processing image: {e}")
+        return failed(page, str(e)), executor
+
+
+def _text_page(text_pages: List[pdf.TextPage], i: int) -> pdf.TextPage | None:
+    return text_pages[i] if i < len(text_pages) and text_pages[i].words else None
 
-    return row_texts
 
+def iter_page_rows(
+    images: Iterable[Image],
+    workers: int = 1,
+    batch: str = "cell",
+    backend: str = "pytesseract",
+    text_pages: List[pdf.TextPage] = None,
+    cache: ocr.OCRCache = None,
+    debug_grid: str = None,
+    template: grid.ColumnTemplate = None,
+    counters: Counter = None,
+    column_profiles: dict[int, str] = None,
+    known: set[str] = None,
+    fingerprints: list[str | None] = None,
+) -> Iterator[list[list[str]] | None]:
+    """
+    Yields the table rows found on each page of `images`, in page order. With `workers` > 1 the pages
+    are OCR'd in a pool of that many processes (0 means one per CPU); a page that fails, or crashes its
+    worker, is reported and yields no rows instead of aborting the run. `batch` sets how many cells are
+    sent to each tesseract invocation (see `ocr.ocr_rows`) and `backend` names the `ocr.backends` engine
+    each process runs it with. Pages with a usable entry in `text_pages` (the PDF's embedded text layer,
+    one entry per page of `images`) are read from it rather than OCR'd. Cells found in `cache` aren't
+    OCR'd again.
 
-def process_images(images : List[Image]) -> list[str]:
+    When `images` is a `pdf.PDFPages`, each page is rendered only when it is about to be processed (in
+    the worker that processes it), at the resolution that page needs. With `debug_grid`, an image of the
+    table grid found on each of those pages is written to that directory (see `grid.draw`). With a
+    column `template`, rows that match it aren't searched for vertical rules (see `grid.detect`). The
+    `ocr.counters` of every page, wherever it was processed, are added to `counters`, and the stage
+    timings of pages processed in worker processes to `metrics.counters`. OCR'd columns named in
+    `column_profiles` are read with the OCR settings of that profile (see
+    `SectionParser.column_profiles`).
+
+    With a set of `known` page fingerprints, the fingerprint of each page (or None, if it couldn't be
+    read) is appended to `fingerprints`, and pages whose fingerprint is in `known` yield None instead of
+    being read (see `_process_page`).
+    """
+    text_pages = text_pages or []
+    first_page = 1
+    if isinstance(images, pdf.PDFPages):
+        first_page = images.first_page
+        images = images.refs()
+    workers = workers or os.cpu_count()
+    if debug_grid:
+        os.makedirs(debug_grid, exist_ok=True)
+    process_page = partial(
+        _process_page,
+        batch=batch,
+        backend=backend,
+        cache=cache,
+        debug_grid=debug_grid,
+        template=template,
+        column_profiles=column_profiles,
+        known=known,
+    )
+    if fingerprints is None:
+        fingerprints = []
+    if workers <= 1:
+        for i, image in enumerate(images):
+            page = first_page + i
+            try:
+                rows, counts, fingerprint = process_page(image, _text_page(text_pages, i))
+            except Exception as e:
+                rows, counts, fingerprint = _page_failed(page, str(e))
+            if counters is not None:
+                counters.update(counts)
+            fingerprints.append(fingerprint)
+            yield rows
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for i, image in enumerate(images):
+            args = (image, _text_page(text_pages, i))
+            executor = _submit_page(pending, executor, workers, process_page, first_page + i, args)
+            # keep a bounded window of pages in flight so results stream out as they complete
+            if len(pending) >= workers * 2:
+                (rows, counts, fingerprint), executor = _collect_page(pending, executor, workers, process_page)
+                if counters is not None:
+                    counters.update(counts)
+                metrics.merge(counts)
+                fingerprints.append(fingerprint)
+                yield rows
+        while pending:
+            (rows, counts, fingerprint), executor = _collect_page(pending, executor, workers, process_page)
+            if counters is not None:
+                counters.update(counts)
+            metrics.merge(counts)
+            fingerprints.append(fingerprint)
+            yield rows
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def process_images(
+    images : Sequence[Image],
+    workers: int = 1,
+    batch: str = "cell",
+    backend: str = "pytesseract",
+    text_pages: List[pdf.TextPage] = None,
+    cache: ocr.OCRCache = None,
+) -> list[str]:
     row_texts = []
-    for image in tqdm(images, desc="Reading PDF pages..."):
-        image_cv = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        row_texts = process_image_cells(image_cv)
-        row_texts.extend(row_texts)
+    for page_rows in tqdm(iter_page_rows(images, workers, batch, backend, text_pages, cache), desc="Reading PDF pages...", total=len(images)):
+        row_texts.extend(page_rows)
     return row_texts
 
-def read_pdf_path(input):
+def read_pdf_path(
+    input,
+    workers: int = 1,
+    batch: str = "cell",
+    backend: str = "pytesseract",
+    text_layer: bool = True,
+    dpi: int = 200,
+    cache: ocr.OCRCache = None,
+):
     print(f"Processing PDF file: {input}\n" + "=" * (len(input) + 21))
-    return process_images(convert_from_path(input))
+    pages = pdf.PDFPages(input, dpi)
+    text_pages = pdf.read_text_layer(pages.path) if text_layer else []
+    return process_images(pages, workers, batch, backend, text_pages, cache)
 
-def read_pdf_bytes(input):
+def read_pdf_bytes(
+    input,
+    workers: int = 1,
+    batch: str = "cell",
+    backend: str = "pytesseract",
+    text_layer: bool = True,
+    dpi: int = 200,
+    cache: ocr.OCRCache = None,
+):
     print(f"Processing {len(input)} bytes of PDF data\n")
-    return process_images(convert_from_bytes(input))
+    pages = pdf.PDFPages(input, dpi)
+    text_pages = pdf.read_text_layer(pages.path) if text_layer else []
+    return process_images(pages, workers, batch, backend, text_pages, cache)
+
+def learn_column_template(images: pdf.PDFPages, pages: int = 2) -> grid.ColumnTemplate | None:
+    """
+    The column layout of the table on the first `pages` of `images`, or None if they don't agree on one.
+    """
+    templates = []
+    for image in itertools.islice(images, pages):
+        adaptive_thresh = threshold_image(cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR))
+        page_grid = grid.detect(adaptive_thresh, images.dpi)
+        templates.append(grid.ColumnTemplate.from_grid(page_grid, adaptive_thresh.shape[1]))
+    return grid.ColumnTemplate.learn(templates)
+
 
 class SectionParser(ABC):
-    def __init__(self, file_path: str = None, file_bytes : bytes = None):
+    # the F-7A section this parser reads, as numbered on the form
+    section: int = None
+    # the sqlite table parsed rows are written to, its columns (name -> SQL type) and indexed columns
+    table: str = None
+    columns: Dict[str, str] = {}
+    indexes = ["date", "name", "amount"]
+    # rows written to sqlite per executemany/commit
+    commit_every = 500
+    # rows per Parquet row group / Arrow record batch
+    row_group_size = 10000
+    # OCR profile to read each column with, by index (negative indices count from the end of the row);
+    # other columns are read as free text. Every section's table starts with the date and ends with the
+    # amount.
+    column_profiles: dict[int, str] = {0: "date", -1: "amount"}
+
+    def __init__(
+        self,
+        file_path: str = None,
+        file_bytes : bytes = None,
+        workers: int = 1,
+        batch: str = "cell",
+        backend: str = "pytesseract",
+        text_layer: bool = True,
+        dpi: int = 200,
+        stream: bool = False,
+        pages: tuple[int, int] = None,
+        auto_section: bool = False,
+        cache: ocr.OCRCache = None,
+        debug_grid: str = None,
+        template: grid.ColumnTemplate = None,
+        learn_template: int = 0,
+        ocr_profiles: bool = True,
+    ):
+        """
+        Reads the table rows of the PDF at `file_path` (or in `file_bytes`) into `row_texts`. With
+        `stream=True` nothing is read up front; rows are OCR'd as `iter_rows`/`iter_parsed` are consumed.
+
+        Only the pages from `pages[0]` to `pages[1]` (1-based, inclusive) are rendered and read when given.
+        With `auto_section=True` the pages of this parser's `section` are located (within `pages`, when
+        given) by matching page headers (see `sections.locate_sections`), before any cells are OCR'd.
+
+        With a `cache`, cells that have already been OCR'd (e.g. in an earlier run over the same or an
+        amended filing) are read from it instead of being OCR'd again.
+
+        With `debug_grid`, an image of the table grid found on each page is written to that directory.
+
+        Every page of a section's table has the same columns: with a column `template`, or one learned
+        from the first `learn_template` pages read, rows that line up with it skip column detection.
+
+        Columns in `column_profiles` are OCR'd with settings specific to what they hold, unless
+        `ocr_profiles` is False.
+        """
+        self.row_texts = None
         if any([file_path, file_bytes]):
-            self.images = convert_from_bytes(file_path) if file_bytes else convert_from_path(file_bytes)
-            self.row_texts = [
-                    row
-                    for row in (read_pdf_bytes(file_path) if file_bytes else read_pdf_path(file_path))
-                    if len(row) >= 4 and row[0].strip().upper() != "DATE"
-            ]
+            # rendered a page at a time as they're processed, never all at once
+            self.images = pdf.PDFPages(file_bytes or file_path, dpi)
+            if file_bytes:
+                print(f"Processing {len(file_bytes)} bytes of PDF data\n")
+            else:
+                print(f"Processing PDF file: {file_path}\n" + "=" * (len(file_path) + 21))
+            text_pages = pdf.read_text_layer(self.images.path) if text_layer else []
+            if pages:
+                self.images = self.images.between(*pages)
+            if auto_section:
+                # only the pages asked for (every page, by default) are searched
+                found = sections.find_section_pages(
+                    self.images,
+                    self.section,
+                    backend,
+                    text_pages[self.images.first_page - 1 : self.images.last_page],
+                    workers,
+                )
+                if found is None:
+                    print(f"Section {self.section} not found, reading {f'pages {pages[0]}-{pages[1]}' if pages else 'every page'}")
+                else:
+                    print(f"Found section {self.section} on pages {found[0]}-{found[1]}")
+                    self.images = self.images.between(*found)
+            self.text_pages = text_pages[self.images.first_page - 1 : self.images.last_page]
+            self.workers, self.batch, self.backend, self.cache = workers, batch, backend, cache
+            self.debug_grid = debug_grid
+            if learn_template and template is None:
+                template = learn_column_template(self.images, learn_template)
+                if template is None:
+                    print(f"No common column layout on the first {learn_template} page(s), detecting columns on every page")
+            self.template = template
+            self.ocr_profiles = ocr_profiles
+            # totals of `ocr.counters` over every page read
+            self.counters = Counter()
+            if not stream:
+                self.row_texts = list(self.iter_rows())
         return
 
+    def iter_pages(
+        self, known: set[str] = None, fingerprints: list[str | None] = None
+    ) -> Iterator[list[list[str]] | None]:
+        """
+        Yields the table rows of each page of the PDF as it is processed (see `iter_page_rows`).
+        """
+        pages = iter_page_rows(
+            self.images,
+            self.workers,
+            self.batch,
+            self.backend,
+            self.text_pages,
+            self.cache,
+            self.debug_grid,
+            self.template,
+            self.counters,
+            self.column_profiles if self.ocr_profiles else None,
+            known,
+            fingerprints,
+        )
+        return tqdm(pages, desc="Reading PDF pages...", total=len(self.images))
+
+    def iter_rows(self) -> Iterator[list[str]]:
+        """
+        Yields the data rows of the PDF as each page is processed, skipping header and partial rows.
+        """
+        for page_rows in self.iter_pages():
+            yield from filter(self.is_data_row, page_rows)
+
+    @staticmethod
+    def is_data_row(row: list[str]) -> bool:
+        """
+        Whether a table row read from a page holds data, rather than being a header or partial row.
+        """
+        return len(row) >= 4 and row[0].strip().upper() != "DATE"
+
     @abstractmethod
     def parse(row_text: list[str]) -> Dict:
         pass
 
-    @abstractmethod
-    def insert_rows_to_db(self, rows: List[Dict], db_path: str):
-        pass
+    def insert_rows_to_db(self, rows: Iterable[Dict], db_path: str, source_filing: str = None, batch_size: int = None):
+        """
+        Appends `rows` to this parser's table in the SQLite database at `db_path`, creating it if needed.
+        Each row is tagged with `source_filing` so many filings can be loaded into the same database.
+        """
+        writer = db.SQLiteWriter(db_path, self.table, self.columns, self.indexes, batch_size or self.commit_every)
+        return writer.write(tqdm(rows, desc="Writing rows to database..."), source_filing)
+
+    def update_db(self, db_path: str, source_filing: str, amends: str = None) -> Counter:
+        """
+        Writes the rows of the PDF to this parser's table in the SQLite database at `db_path`, page by
+        page, in place of the rows of `source_filing` (or, until it has been written once, of the filing
+        it `amends`), and records a fingerprint of every page (see `page_fingerprint`). Pages whose
+        fingerprint that filing already has aren't read again; only the rows of pages that changed are
+        replaced, in one transaction once every page has been read (see `db.SQLiteWriter.replace_pages`).
+        When only some of the pages were read (`pages`, `auto_section`), the rows `source_filing` has on
+        the others are left as they are; an amendment replaces every row of the filing it amends.
+        """
+        writer = db.SQLiteWriter(db_path, self.table, self.columns, self.indexes)
+        conn = writer.connect()
+        try:
+            base = amends if amends and not writer.page_fingerprints(conn, source_filing) else source_filing
+            known = set(writer.page_fingerprints(conn, base).values())
+            fingerprints = []
+            pages = []
+            for i, rows in enumerate(self.iter_pages(known, fingerprints)):
+                with metrics.timer("parse"):
+                    parsed = None if rows is None else [self.parse(row) for row in rows if self.is_data_row(row)]
+                pages.append((self.images.first_page + i, fingerprints[i], parsed))
+            first_page, last_page = self.images.first_page, self.images.last_page
+            page_range = None
+            if base == source_filing and (first_page, last_page) != (1, self.images.pages):
+                page_range = (first_page, last_page)
+            return writer.replace_pages(conn, pages, source_filing, base, page_range)
+        finally:
+            conn.close()
+
+    def iter_parsed(self, rows: Iterable[list[str]] = None) -> Iterator[Dict]:
+        rows = rows or self.row_texts
+        for row in self.iter_rows() if rows is None else rows:
+            with metrics.timer("parse"):
+                parsed = self.parse(row)
+            yield parsed
 
     def parse_all(self, rows: List[Dict] = None) -> List[Dict]:
-        return [self.parse(row) for row in (rows or self.row_texts)]
+        return list(self.iter_parsed(rows))
 
 
 class ContributionsUnder250Parser(SectionParser):
+    section = 2
+    table = "contributions_under_250"
+    columns = {
+        "date": "TEXT NOT NULL",
+        "name": "TEXT NOT NULL",
+        "election_type": "TEXT NOT NULL",
+        "amount": "REAL NOT NULL",
+    }
+
     def parse(self, row_text: str) -> dict:
         return {
             "date": row_text[0],
@@ -127,84 +618,91 @@ class ContributionsUnder250Parser(SectionParser):
             ),
         }
 
-    def insert_rows_to_db(self, rows, output):
-        conn = sqlite3.connect(output)
-        cursor = conn.cursor()
 
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS contributions_under_250 (
-            date TEXT NOT NULL,
-            name TEXT NOT NULL,
-            election_type TEXT NOT NULL,
-            amount REAL NOT NULL
-        )
-        """)
-
-        for row in tqdm(rows, desc="Writing rows to database..."):
-            cursor.execute(
-                """
-            INSERT INTO contributions_under_250 (
-                date, name, election_type, amount
-            ) VALUES (:date, :name, :election_type, :amount)
-            """,
-                row,
-            )
-
-        conn.commit()
-        conn.close()
+class ContributionsOver250Parser(SectionParser):
+    section = 3
+    table = "contributions_over_250"
+    columns = {
+        "date": "TEXT NOT NULL",
+        "name": "TEXT NOT NULL",
+        "address": "TEXT NOT NULL",
+        "mailing_address": "TEXT",
+        "employer_occupation": "TEXT",
+        "election_type": "TEXT NOT NULL",
+        "amount": "REAL NOT NULL",
+    }
 
+    # the contributor cell's fields, matched one after another, each against what's left of the cell
+    # once the fields before it are cut out of it
+    __name = re.compile(r"Name: (.*?)[\n\s]+(?:Mailing )?Address:", re.DOTALL)
+    __mailing_address = re.compile(r"Mailing Address: (.*?)[\n\s]+Employer")
+    __address = re.compile(r"Address: (.*?)[\n\s]*(?:Employer|Mailing|$)", re.DOTALL)
+    __employer_occupation = re.compile(r"Employer/Occupation: (.*?)[\n\s]*$", re.DOTALL)
+    # the usual layout of the cell in one pass; only taken when the cell holds no more labels than the
+    # layout itself (so none of the fields contain another field's label), where it finds exactly what
+    # the field-by-field patterns above would
+    __contributor = re.compile(
+        r"Name: (?P<name>.*?)\s+Address: (?P<address>.*?)"
+        r"(?:\s+Mailing Address: (?P<mailing_address>[^\n]*?))?"
+        r"\s+Employer/Occupation: (?P<employer_occupation>.*)",
+        re.DOTALL,
+    )
+    __amount = re.compile(r"\$[\d,.]+")
 
-class ContributionsOver250Parser(SectionParser):
-    def parse(self, row_text: list[str]) -> dict:
-        date = row_text[0]
+    def contributor_fields(self, text: str) -> tuple[str, str, str, str]:
+        """
+        The name, address, mailing address and employer/occupation in the text of a contributor cell,
+        each "" if missing.
+        """
+        match = self.__contributor.fullmatch(text)
+        mailing = match is not None and match["mailing_address"] is not None
+        if (
+            match
+            and text.count("Name: ") == 1
+            and text.count("Address:") == 1 + mailing
+            and text.count("Mailing") == mailing
+            and text.count("Employer") == 1
+        ):
+            return (
+                match["name"].replace("\n", " ").strip(),
+                match["address"].replace("\n", " ").strip(),
+                (match["mailing_address"] or "").replace("\n", " ").strip(),
+                match["employer_occupation"].replace("\n", "").strip(),
+            )
 
-        name_regex = r"Name: (.*?)[\n\s]+(?:Mailing )?Address:"
-        name_match = re.search(name_regex, row_text[1], flags=re.DOTALL)
+        name_match = self.__name.search(text)
         if name_match:
-            row_text[1] = (
-                row_text[1][: name_match.start(1) - 6].strip()
-                + row_text[1][name_match.end(1) :].strip()
-            )
+            text = text[: name_match.start(1) - 6].strip() + text[name_match.end(1) :].strip()
 
-        mailing_address_regex = r"Mailing Address: (.*?)[\n\s]+Employer"
-        mailing_address_match = re.search(mailing_address_regex, row_text[1])
-        mailing_address = (
-            mailing_address_match.group(1).replace("\n", " ").strip()
-            if mailing_address_match
-            else ""
-        )
+        mailing_address_match = self.__mailing_address.search(text)
+        mailing_address = mailing_address_match.group(1).replace("\n", " ").strip() if mailing_address_match else ""
         if mailing_address_match:
-            row_text[1] = (
-                row_text[1][: mailing_address_match.start(1) - 17].strip()
-                + row_text[1][mailing_address_match.end(1) :].strip()
+            text = (
+                text[: mailing_address_match.start(1) - 17].strip() + text[mailing_address_match.end(1) :].strip()
             )
 
-        address_regex = r"Address: (.*?)[\n\s]*(?:Employer|Mailing|$)"
-        address_match = re.search(address_regex, row_text[1], flags=re.DOTALL)
-        address = (
-            address_match.group(1).replace("\n", " ").strip() if address_match else ""
-        )
+        address_match = self.__address.search(text)
+        address = address_match.group(1).replace("\n", " ").strip() if address_match else ""
         if address_match:
-            row_text[1] = (
-                row_text[1][: address_match.start(1) - 9].strip()
-                + row_text[1][address_match.end(1) :].strip()
-            )
+            text = text[: address_match.start(1) - 9].strip() + text[address_match.end(1) :].strip()
 
-        emp_regex = r"Employer/Occupation: (.*?)[\n\s]*$"
-        emp_match = re.search(emp_regex, row_text[1], flags=re.DOTALL)
-        employer_occupation = (
-            emp_match.group(1).replace("\n", "").strip() if emp_match else ""
-        )
+        emp_match = self.__employer_occupation.search(text)
+        employer_occupation = emp_match.group(1).replace("\n", "").strip() if emp_match else ""
+
+        name = name_match.group(1).replace("\n", " ").strip() if name_match else ""
+        return name, address, mailing_address, employer_occupation
 
+    def parse(self, row_text: list[str]) -> dict:
+        name, address, mailing_address, employer_occupation = self.contributor_fields(row_text[1])
         amount = (
             row_text[-1].replace("$", "").replace(",", "")
-            if re.match(r"\$[\d,.]+", str(row_text[-1]))
+            if self.__amount.match(str(row_text[-1]))
             else "0"
         )
 
         return {
-            "date": date,
-            "name": name_match.group(1).replace("\n", " ").strip() if name_match else "",
+            "date": row_text[0],
+            "name": name,
             "address": address,
             "mailing_address": mailing_address if mailing_address else None,
             "employer_occupation": employer_occupation if employer_occupation else None,
@@ -212,37 +710,19 @@ class ContributionsOver250Parser(SectionParser):
             "amount": amount,
         }
 
-    def insert_rows_to_db(self, rows, output):
-        conn = sqlite3.connect(output)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS contributions_over_250 (
-            date TEXT NOT NULL,
-            name TEXT NOT NULL,
-            address TEXT NOT NULL,
-            mailing_address TEXT,
-            employer_occupation TEXT,
-            election_type TEXT NOT NULL,
-            amount REAL NOT NULL
-        )
-        """)
-
-        for row in tqdm(rows, desc="Writing rows to database..."):
-            cursor.execute(
-                """
-            INSERT INTO contributions_over_250 (
-                date, name, address, mailing_address, employer_occupation, election_type, amount
-            ) VALUES (:date, :name, :address, :mailing_address, :employer_occupation, :election_type, :amount)
-            """,
-                row,
-            )
-
-        conn.commit()
-        conn.close()
-
 
 class ItemizedExpenditures(SectionParser):
+    section = 7
+    table = "itemized_expenditures"
+    columns = {
+        "date": "TEXT NOT NULL",
+        "vendor_name": "TEXT NOT NULL",
+        "vendor_address": "TEXT",
+        "expense_description": "TEXT NOT NULL",
+        "amount": "REAL NOT NULL",
+    }
+    indexes = ["date", "vendor_name", "amount"]
+
     def parse(self, row_text: list[str]) -> dict:
         vendor_name = row_text[1].split("\n")[0]
         vendor_address = (
@@ -262,83 +742,231 @@ class ItemizedExpenditures(SectionParser):
             ),
         }
 
-    def insert_rows_to_db(self, rows: List[Dict], output: str):
-        conn = sqlite3.connect(output)
-        c = conn.cursor()
-
-        c.execute("""
-        CREATE TABLE IF NOT EXISTS itemized_expenditures (
-            date TEXT NOT NULL,
-            vendor_name TEXT NOT NULL,
-            vendor_address TEXT,
-            expense_description TEXT NOT NULL,
-            amount REAL NOT NULL
-        )
-        """)
-
-        for row in tqdm(rows, desc="Writing rows to database..."):
-            c.execute(
-                """
-            INSERT INTO itemized_expenditures (
-                date, vendor_name, vendor_address, expense_description, amount
-            ) VALUES (:date, :vendor_name, :vendor_address, :expense_description, :amount)
-            """,
-                row,
-            )
 
-        conn.commit()
-        conn.close()
+parsers: dict[int, type[SectionParser]] = {
+    2: ContributionsUnder250Parser,
+    3: ContributionsOver250Parser,
+    7: ItemizedExpenditures,
+}
 
-        return
 
+def _peek(rows: Iterable[dict]) -> tuple[dict | None, Iterator[dict]]:
+    rows = iter(rows)
+    first = next(rows, None)
+    return first, rows if first is None else itertools.chain([first], rows)
 
-def write_to_file(data: list[dict], output, format, parser: SectionParser):
+
+def arrow_schema(parser: SectionParser):
+    """
+    The Arrow schema of a section's rows: its `date` column as a date, REAL (and INTEGER) columns as
+    float64 (and int64) and the rest as strings, every one nullable.
+    """
+    import pyarrow as pa
+
+    def column_type(name: str, sql_type: str):
+        if name == "date":
+            return pa.date32()
+        if sql_type.startswith("REAL"):
+            return pa.float64()
+        if sql_type.startswith("INTEGER"):
+            return pa.int64()
+        return pa.string()
+
+    return pa.schema([(name, column_type(name, sql_type)) for name, sql_type in parser.columns.items()])
+
+
+def _arrow_value(value, type):
+    import pyarrow as pa
+
+    # values OCR'd wrong (a date like "4/3I/2024", an amount like "1,2O0") become null
+    try:
+        if type == pa.date32():
+            return datetime.strptime(value, "%m/%d/%Y").date()
+        if type == pa.float64():
+            return float(value)
+        if type == pa.int64():
+            return int(value)
+    except (TypeError, ValueError):
+        return None
+    return value
+
+
+def write_arrow(data: Iterable[dict], output: str, format: str, parser: SectionParser, row_group_size: int = None):
+    """
+    Writes `data` to `output` as a Parquet file or an Arrow IPC file (`format` "parquet" or "arrow") with
+    the types of `arrow_schema`, a row group (or record batch) of `row_group_size` rows at a time as they
+    are consumed.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(parser)
+    writer = pq.ParquetWriter(output, schema) if format == "parquet" else pa.ipc.new_file(output, schema)
+    rows = iter(data)
+    try:
+        while batch := list(itertools.islice(rows, row_group_size or parser.row_group_size)):
+            with metrics.timer("write"):
+                columns = [[_arrow_value(row.get(field.name), field.type) for row in batch] for field in schema]
+                writer.write_batch(pa.record_batch(columns, schema=schema))
+    finally:
+        writer.close()
+
+
+def write_to_file(
+    data: Iterable[dict],
+    output,
+    format,
+    parser: SectionParser,
+    source_filing: str = None,
+    db_batch_size: int = None,
+    row_group_size: int = None,
+):
+    """
+    Writes `data` to `output` as it is consumed, so it can be a generator of rows that are still being
+    OCR'd (see `SectionParser.iter_parsed`); each row is flushed to the file once it is written. SQLite
+    output is appended to `output` in batches of `db_batch_size` rows, tagged with `source_filing`;
+    Parquet and Arrow output is written `row_group_size` rows at a time (see `write_arrow`).
+    """
     if format == "csv":
         import csv
 
-        with tqdm(
-            open(output, "w", newline=""), desc="Writing rows to CSV..."
-        ) as csvfile:
-            fieldnames = data[0].keys()
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        first, data = _peek(data)
+        with open(output, "w", newline="") as csvfile:
+            if first is None:
+                return
+            writer = csv.DictWriter(csvfile, fieldnames=first.keys())
             writer.writeheader()
-            writer.writerows(data)
+            for row in tqdm(data, desc="Writing rows to CSV..."):
+                with metrics.timer("write"):
+                    writer.writerow(row)
+                    csvfile.flush()
     elif format == "json":
         import json
+        import textwrap
+
+        with open(output, "w") as jsonfile:
+            # the same document json.dump(data, indent=4) would write, one element at a time
+            jsonfile.write("[")
+            separator = "\n"
+            for row in tqdm(data, desc="Writing rows to JSON..."):
+                with metrics.timer("write"):
+                    jsonfile.write(separator + textwrap.indent(json.dumps(row, indent=4), " " * 4))
+                    jsonfile.flush()
+                separator = ",\n"
+            jsonfile.write("]" if separator == "\n" else "\n]")
+    elif format == "jsonl":
+        import json
 
-        with tqdm(open(output, "w"), desc="Writing rows to JSON...") as jsonfile:
-            json.dump(data, jsonfile, indent=4)
+        with open(output, "w") as jsonfile:
+            for row in tqdm(data, desc="Writing rows to JSON lines..."):
+                with metrics.timer("write"):
+                    jsonfile.write(json.dumps(row) + "\n")
+                    jsonfile.flush()
     elif format == "sqlite":
-        parser.insert_rows_to_db(data, output)
+        parser.insert_rows_to_db(data, output, source_filing, db_batch_size)
+    elif format in ("parquet", "arrow"):
+        write_arrow(tqdm(data, desc=f"Writing rows to {format.title()} file..."), output, format, parser, row_group_size)
     elif format == "xlsx":
         from openpyxl import Workbook
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Contributions over $250"
+        first, data = _peek(data)
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Contributions over $250")
 
-        ws.append(data.keys())
-        [
-            ws.append(list(row.values()))
-            for row in tqdm(data, desc="Writing rows to Excel file...")
-        ]
+        if first is not None:
+            ws.append(list(first.keys()))
+        for row in tqdm(data, desc="Writing rows to Excel file..."):
+            with metrics.timer("write"):
+                ws.append(list(row.values()))
 
-        wb.save(output)
+        with metrics.timer("write"):
+            wb.save(output)
     elif format == "print":
         for row in data:
-            print(row)
+            print(row, flush=True)
 
 
-def main():
-    argparser = argparse.ArgumentParser(
-        description="Parse WVSoS's campaign finance report PDFs into structured data"
-    )
+def _page_range(value: str) -> tuple[int, int]:
+    match = re.fullmatch(r"(\d+)(?:-(\d+))?", value.strip())
+    if not match or int(match.group(1)) < 1 or int(match.group(2) or match.group(1)) < int(match.group(1)):
+        raise argparse.ArgumentTypeError(f"invalid page range: {value!r}")
+    return int(match.group(1)), int(match.group(2) or match.group(1))
+
+
+def add_reading_arguments(argparser: argparse.ArgumentParser, workers: int = 1):
+    """
+    Adds the options for which section to read and how its pages are read (OCR settings and cache,
+    profiling) that this script shares with ingest.py, with `workers` as the default of --workers.
+    """
     argparser.add_argument(
         "--section",
         type=int,
         help="Section number to parse, read documentation for more information",
         default=3,
-        choices=[2, 3, 7],
+        choices=sorted(parsers),
+    )
+    argparser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of processes to OCR pages with (0 for one per CPU)",
+        default=workers,
+    )
+    argparser.add_argument(
+        "--ocr-batch",
+        type=str,
+        help="Number of table cells to OCR per tesseract invocation",
+        default="cell",
+        choices=["cell", "row", "page"],
+    )
+    argparser.add_argument(
+        "--ocr-backend",
+        type=str,
+        help="OCR engine: the tesseract binary via pytesseract, or libtesseract in-process via tesserocr",
+        default="pytesseract",
+        choices=["pytesseract", "tesserocr"],
+    )
+    argparser.add_argument(
+        "--force-ocr",
+        action="store_true",
+        help="OCR every page, even if the PDF has an embedded text layer",
+    )
+    argparser.add_argument(
+        "--uniform-ocr",
+        action="store_true",
+        help="OCR the date and amount columns with the same settings as every other column",
+    )
+    argparser.add_argument(
+        "--dpi",
+        type=int,
+        help="Resolution to render pages at for OCR",
+        default=200,
+    )
+    argparser.add_argument(
+        "--ocr-cache",
+        type=str,
+        help="SQLite file to cache OCR results in, so unchanged cells aren't OCR'd again on later runs",
+    )
+    argparser.add_argument(
+        "--ocr-cache-size",
+        type=int,
+        help="Maximum size of the OCR cache in MB, least recently used entries are evicted past it",
+        default=512,
+    )
+    argparser.add_argument(
+        "--profile",
+        type=str,
+        help="JSON file to write the time spent in each stage of the run, OCR counts and peak memory use to",
+    )
+    argparser.add_argument(
+        "--metrics",
+        type=str,
+        help="File to write the same profile to as Prometheus metrics (text exposition format)",
+    )
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description="Parse WVSoS's campaign finance report PDFs into structured data"
     )
     argparser.add_argument("--input", type=str, help="Input file", required=True)
     argparser.add_argument("--output", type=str, help="Output file")
@@ -347,15 +975,89 @@ def main():
         type=str,
         help="Output format",
         default="csv",
-        choices=["csv", "json", "sqlite", "xlsx", "print"],
+        choices=["csv", "json", "jsonl", "sqlite", "parquet", "arrow", "xlsx", "print"],
+    )
+    add_reading_arguments(argparser)
+    argparser.add_argument(
+        "--pages",
+        type=_page_range,
+        help="Range of pages to read, e.g. 12-87 (default: every page)",
+    )
+    argparser.add_argument(
+        "--auto-section",
+        action="store_true",
+        help="Locate the pages --section is on (within --pages, if given) before reading them, instead of reading every page",
+    )
+    argparser.add_argument(
+        "--source-filing",
+        type=str,
+        help="Name to tag sqlite rows with, so several filings can share one database (default: input file name)",
+    )
+    argparser.add_argument(
+        "--db-batch-size",
+        type=int,
+        help="Number of rows to insert per sqlite transaction",
+        default=SectionParser.commit_every,
+    )
+    argparser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="With --format sqlite, only read the pages that changed since the filing was last written and replace their rows",
+    )
+    argparser.add_argument(
+        "--amends",
+        type=str,
+        help="Source filing that the input amends, whose rows it replaces (implies --incremental)",
+    )
+    argparser.add_argument(
+        "--row-group-size",
+        type=int,
+        help="Number of rows per Parquet row group or Arrow record batch",
+        default=SectionParser.row_group_size,
+    )
+    argparser.add_argument(
+        "--debug-grid",
+        type=str,
+        help="Directory to write an image of the table grid found on each page to",
+    )
+    argparser.add_argument(
+        "--learn-template",
+        type=int,
+        help="Learn the table's column layout from this many of the first pages and reuse it on the rest",
+        default=0,
+    )
+    argparser.add_argument(
+        "--column-template",
+        type=str,
+        help="JSON file of the table's column layout to reuse on every page (written to with --learn-template)",
     )
     args = argparser.parse_args()
-    parsers: dict[int, SectionParser] = {
-        2: ContributionsUnder250Parser,
-        3: ContributionsOver250Parser,
-        7: ItemizedExpenditures,
-    }
-    parser = parsers[args.section](file_path=args.input)
+    start = time.perf_counter()
+    if (args.incremental or args.amends) and args.format != "sqlite":
+        argparser.error("--incremental and --amends need --format sqlite")
+    template = (
+        grid.ColumnTemplate.load(args.column_template) if args.column_template and not args.learn_template else None
+    )
+    cache = ocr.OCRCache(args.ocr_cache, args.ocr_cache_size * 1024 * 1024) if args.ocr_cache else None
+    cache_stats = cache.stats() if cache else {}
+    parser = parsers[args.section](
+        file_path=args.input,
+        workers=args.workers,
+        batch=args.ocr_batch,
+        backend=args.ocr_backend,
+        text_layer=not args.force_ocr,
+        dpi=args.dpi,
+        stream=True,
+        pages=args.pages,
+        auto_section=args.auto_section,
+        cache=cache,
+        debug_grid=args.debug_grid,
+        template=template,
+        learn_template=args.learn_template,
+        ocr_profiles=not args.uniform_ocr,
+    )
+    if args.learn_template and args.column_template and parser.template:
+        parser.template.save(args.column_template)
     output = (
         args.output
         if args.output
@@ -363,7 +1065,41 @@ def main():
         + (args.format if args.format != "sqlite" else "sqlite3")
     )
 
-    write_to_file(parser.parse_all(), output, args.format, parser)
+    source_filing = args.source_filing or os.path.basename(args.input)
+    if args.incremental or args.amends:
+        stats = parser.update_db(output, source_filing, args.amends)
+        print(
+            f"{stats['pages_written']} page(s) read, {stats['pages_kept']} unchanged and {stats['pages_copied']} moved"
+            f" page(s) skipped; {stats['rows_deleted']} row(s) deleted, {stats['rows_inserted']} inserted"
+        )
+        if stats["pages_failed"]:
+            print(f"{stats['pages_failed']} page(s) couldn't be read and kept their rows; they'll be read again next time")
+    else:
+        write_to_file(
+            parser.iter_parsed(),
+            output,
+            args.format,
+            parser,
+            source_filing,
+            args.db_batch_size,
+            args.row_group_size,
+        )
+
+    if parser.counters["cells"]:
+        counters = parser.counters
+        print(
+            f"OCR: {counters['blank_cells']} of {counters['cells']} cells and {counters['blank_rows']} rows were blank"
+            f" and skipped, {counters['ocr_calls']} tesseract calls made"
+        )
+    if cache:
+        stats = {name: value - cache_stats.get(name, 0) for name, value in cache.stats().items()}
+        print(
+            f"OCR cache: {stats.get('hits', 0)} hits, {stats.get('misses', 0)} misses,"
+            f" {stats.get('evictions', 0)} evictions"
+        )
+    if args.profile or args.metrics:
+        profile = metrics.report(parser.counters, time.perf_counter() - start)
+        metrics.write_report(profile, args.profile, args.metrics)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,163 @@
+import copy
+import subprocess
+import tempfile
+import xml.etree.ElementTree as ET
+from collections.abc import Sequence
+from pdf2image import convert_from_path, pdfinfo_from_path
+from typing import Iterator, NamedTuple
+import metrics
+
+# pages that are read from their text layer only need to be rendered well enough to find the table rules
+TEXT_LAYER_DPI = 100
+
+
+class Word(NamedTuple):
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+    line: int
+    text: str
+
+
+class PageRef(NamedTuple):
+    """
+    A single not-yet-rendered page of a PDF on disk. Cheap to pickle, so worker processes can be handed
+    a page to render themselves rather than a full-resolution image.
+    """
+
+    path: str
+    page: int
+    dpi: int = 200
+
+    def render(self, dpi: int = None):
+        with metrics.timer("rasterize"):
+            return convert_from_path(self.path, dpi=dpi or self.dpi, first_page=self.page, last_page=self.page)[0]
+
+
+class PDFPages(Sequence):
+    """
+    The pages of a PDF as a lazily rendered sequence of PIL images. Only `window` pages are held in
+    memory at a time while iterating, so memory use doesn't grow with the length of the filing. PDF
+    bytes are spooled to a temporary file that lives as long as this object.
+
+    `first_page` and `last_page` (1-based, inclusive) limit the sequence to a range of the document's
+    pages; pages outside of it are never rendered.
+    """
+
+    def __init__(
+        self, input: str | bytes, dpi: int = 200, window: int = 1, first_page: int = None, last_page: int = None
+    ):
+        self.tempfile = None
+        if isinstance(input, bytes):
+            self.tempfile = tempfile.NamedTemporaryFile(suffix=".pdf")
+            self.tempfile.write(input)
+            self.tempfile.flush()
+            input = self.tempfile.name
+        self.path = input
+        self.dpi = dpi
+        self.window = window
+        self.pages = pdfinfo_from_path(self.path)["Pages"]
+        self.first_page = max(first_page or 1, 1)
+        self.last_page = min(last_page or self.pages, self.pages)
+
+    def __len__(self) -> int:
+        return max(self.last_page - self.first_page + 1, 0)
+
+    def __getitem__(self, i: int):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("page index out of range")
+        return self.ref(self.first_page + i).render()
+
+    def __iter__(self) -> Iterator:
+        for first in range(self.first_page, self.last_page + 1, self.window):
+            last = min(first + self.window - 1, self.last_page)
+            with metrics.timer("rasterize"):
+                images = convert_from_path(self.path, dpi=self.dpi, first_page=first, last_page=last)
+            yield from images
+
+    def ref(self, page: int) -> PageRef:
+        return PageRef(self.path, page, self.dpi)
+
+    def refs(self) -> list[PageRef]:
+        return [self.ref(page) for page in range(self.first_page, self.last_page + 1)]
+
+    def between(self, first_page: int, last_page: int) -> "PDFPages":
+        """
+        The pages of the same document from `first_page` to `last_page`, sharing its temporary file.
+        """
+        pages = copy.copy(self)
+        pages.first_page = max(first_page, 1)
+        pages.last_page = min(last_page, self.pages)
+        return pages
+
+
+class TextPage(NamedTuple):
+    """
+    The embedded text layer of one PDF page, in PDF points from the top-left corner of the page.
+    """
+
+    width: float
+    height: float
+    words: list[Word]
+
+
+def _tag(element: ET.Element) -> str:
+    return element.tag.rsplit("}", 1)[-1]
+
+
+def parse_bbox_layout(xhtml: str) -> list[TextPage]:
+    """
+    Parses the XHTML written by `pdftotext -bbox-layout` into a `TextPage` per page.
+    """
+    pages = []
+    for page in ET.fromstring(xhtml).iter():
+        if _tag(page) != "page":
+            continue
+        words, line_num = [], 0
+        for line in page.iter():
+            if _tag(line) != "line":
+                continue
+            line_num += 1
+            for word in line:
+                if _tag(word) == "word" and word.text and word.text.strip():
+                    words.append(
+                        Word(
+                            float(word.get("xMin")),
+                            float(word.get("yMin")),
+                            float(word.get("xMax")),
+                            float(word.get("yMax")),
+                            line_num,
+                            word.text.strip(),
+                        )
+                    )
+        pages.append(TextPage(float(page.get("width")), float(page.get("height")), words))
+    return pages
+
+
+@metrics.timed("text_layer")
+def read_text_layer(input: str | bytes) -> list[TextPage]:
+    """
+    Extracts the word positions of a PDF's embedded text layer with poppler's `pdftotext` (installed
+    alongside the `pdftoppm` that pdf2image already needs). Scanned pages come back with no words; if
+    the text layer can't be read at all, an empty list is returned and every page falls back to OCR.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+        if isinstance(input, bytes):
+            f.write(input)
+            f.flush()
+            input = f.name
+        try:
+            result = subprocess.run(
+                ["pdftotext", "-bbox-layout", "-enc", "UTF-8", input, "-"],
+                capture_output=True,
+                check=True,
+            )
+            return parse_bbox_layout(result.stdout.decode("utf-8"))
+        except (OSError, subprocess.CalledProcessError, ET.ParseError) as e:
+            print(f"Unable to read text layer, falling back to OCR: {e}")
+            return []
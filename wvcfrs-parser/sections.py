@@ -0,0 +1,177 @@
+import os
+import re
+import ocr
+import pdf
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from tqdm import tqdm
+from typing import Iterable, Iterator
+
+# known header text of each section of the F-7A, as OCR'd with line breaks removed; every pattern is
+# matched at the start of the page's text
+__section_patterns: dict[int, list[str]] = {
+    1: [
+        r"^State of West Virginia Campaign Financial Statement",
+        r"TOTAL CONTRIBUTIONS ELECTION YEAR-TO-DATE(.*?)TOTAL EXPENDITURES ELECTION YEAR-TO-DATE",
+    ],
+    2: [
+        r"^Section 2CONTRIBUTIONS OF\$250 OR LESSDATE",
+        r"^Contributions ofSection 2 \$250",
+        r"^Contributions of\$250 or LessSection 2",
+    ],
+    3: [
+        r"^Section 3CONTRIBUTIONS OFMORE THAN \$250DATE",
+        r"^CONTRIBUTIONS OFSection 3MORE THAN \$250DATE",
+        r"Subtotal of all contributions of \$250 or less \(from page 2\)",
+        r"(?:\d{1,2}\/\d{1,2}\/\d{4})?(.*?)Employer\/Occupation\: (?:\d{1,2}\/\d{1,2}\/\d{4})?",
+    ],
+    4: [
+        r"^Section 4(.*?)FUNDRAISING EVENTS",
+        r"^FUNDRAISING EVENTS(.*?)Section 4",
+        r"Contributions of \$250 or Less Contributions of More than \$250",
+    ],
+    5: [
+        r"^Section 5(.*?)OTHER INCOME: INTEREST",
+        r"^OTHER INCOME: INTEREST(.*?)Section 5",
+    ],
+    6: [r"Section 6 LOANS"],
+    7: [
+        r"^Section 7(.*?)ITEMIZED EXPENDITURES",
+        r"^ITEMIZED EXPENDITURES(.*?)Section 7",
+        r"Total Expenditures:",
+    ],
+    8: [r"Section 8 RECEIPT OF"],
+    9: [r"Section 9 UNPAID BILLS"],
+}
+
+# all of the patterns above as a single regex: an optional lookahead per section, so one match at the
+# start of the page reports every section whose patterns match there
+__section_matcher = re.compile(
+    "".join(
+        f"(?:(?=(?P<section_{section}>{'|'.join(f'(?:{p})' for p in patterns)})))?"
+        for section, patterns in __section_patterns.items()
+    )
+)
+
+
+def match_sections(pg_text: str) -> set[int]:
+    """
+    The sections whose header patterns match the (line-break free) text of a page.
+    """
+    match = __section_matcher.match(pg_text)
+    return {section for section in __section_patterns if match.group(f"section_{section}") is not None}
+
+
+def ocr_page_texts(images: Iterable, backend: str = "pytesseract") -> Iterator[str]:
+    """
+    OCRs each full page, joining its lines the way the section patterns in `locate_sections` expect.
+    """
+    engine = ocr.get_backend(backend)
+    for image in tqdm(images, desc="Locating sections..."):
+        yield engine.image_to_string(image).replace("\n", "")
+
+
+def _ocr_header(page: pdf.PageRef, dpi: int, band: float, backend: str) -> str:
+    image = page.render(dpi)
+    header = image.crop((0, 0, image.width, round(image.height * band)))
+    return ocr.get_backend(backend).image_to_string(header).replace("\n", "")
+
+
+def text_layer_header(text_page: pdf.TextPage, band: float) -> str:
+    lines: dict[int, list[str]] = {}
+    for word in text_page.words:
+        if word.y1 <= text_page.height * band:
+            lines.setdefault(word.line, []).append(word.text)
+    return "".join(" ".join(words) for words in lines.values())
+
+
+def header_texts(
+    pages: pdf.PDFPages,
+    backend: str = "pytesseract",
+    dpi: int = 100,
+    band: float = 0.3,
+    text_pages: list[pdf.TextPage] = None,
+    workers: int = 1,
+) -> Iterator[str]:
+    """
+    A fast alternative to `ocr_page_texts` that only reads the top `band` of each page, from the PDF's
+    text layer when the page has one (`text_pages`, one per page of `pages`) and otherwise by OCR'ing
+    that band rendered at a low `dpi`, in a pool of `workers` processes.
+    """
+    text_pages = text_pages or []
+    refs = pages.refs()
+    scanned = [
+        ref for i, ref in enumerate(refs) if i >= len(text_pages) or not text_pages[i].words
+    ]
+
+    header = partial(_ocr_header, dpi=dpi, band=band, backend=backend)
+    workers = workers or os.cpu_count()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    ocr_texts = executor.map(header, scanned) if executor else map(header, scanned)
+    try:
+        for i, _ in enumerate(tqdm(refs, desc="Locating sections...")):
+            if i < len(text_pages) and text_pages[i].words:
+                yield text_layer_header(text_pages[i], band)
+            else:
+                yield next(ocr_texts)
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+
+def locate_sections(page_texts: Iterable[str], dump_content: bool = False) -> dict[int, tuple[int, ...]]:
+    """
+    Matches the text of each page against known section headers and returns, for each section found,
+    the (0-based) index of its first page and, if it spans more than one, its last page.
+    """
+    page_ranges: dict[int, tuple[int, ...]] = {}
+
+    def extend(section: int, i: int):
+        page_ranges[section] = (page_ranges[section][0], i) if section in page_ranges else (i,)
+
+    for i, pg_text in enumerate(page_texts):
+        found = match_sections(pg_text)
+        if 1 in found:
+            page_ranges[1] = (i,)
+        if 2 in found:
+            extend(2, i)
+        for section in (4, 5):
+            if section in found and not found & {1, 2}:
+                extend(section, i)
+        for section in (6, 7, 8, 9):
+            if section in found and not found & {1, 2, 5}:
+                extend(section, i)
+        if 3 in found and not found & {1, 2, 4, 5} and not (i >= page_ranges.get(4, (9999,))[0]):
+            if dump_content:
+                print(f"Found section 3 in {i + 1}")
+            extend(3, i)
+        if dump_content:
+            print(f"Page {i + 1}:\n{pg_text}\n" + "=" * 80)
+
+    return page_ranges
+
+
+def page_range_map(page_ranges: dict[int, tuple[int, ...]], first_page: int = 1) -> dict[str, dict[str, int]]:
+    """
+    `locate_sections` output as 1-based, inclusive page numbers keyed by section, for writing as JSON.
+    """
+    return {
+        str(section): {"first_page": pages[0] + first_page, "last_page": pages[-1] + first_page}
+        for section, pages in sorted(page_ranges.items())
+    }
+
+
+def find_section_pages(
+    pages: pdf.PDFPages,
+    section: int,
+    backend: str = "pytesseract",
+    text_pages: list[pdf.TextPage] = None,
+    workers: int = 1,
+) -> tuple[int, int] | None:
+    """
+    The 1-based, inclusive range of pages `section` occupies in `pages`, or None if it wasn't found.
+    """
+    page_ranges = locate_sections(header_texts(pages, backend, text_pages=text_pages, workers=workers))
+    if section not in page_ranges:
+        return None
+    return page_ranges[section][0] + pages.first_page, page_ranges[section][-1] + pages.first_page
@@ -0,0 +1,100 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import cfrs
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """
+    A stand-in for the CFRS API: a search that fails with a 503 twice before answering, the bulk CSV
+    download (with a byte order mark and an ETag) and slow report PDFs.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status: int, body: bytes = b"", headers: dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers)))
+        if "GetPublicSiteBasicSearchResult" in self.path:
+            with server.lock:
+                server.searches += 1
+                searches = server.searches
+            if searches <= 2:
+                return self.send(503)
+            return self.send(200, b'{"CandidateInformationslist": [{"IDNumber": 1}]}')
+        if "GetCSVDownloadReport" in self.path:
+            if self.headers.get("If-None-Match") == '"v1"':
+                return self.send(304, headers={"ETag": '"v1"'})
+            return self.send(200, "\ufeffOrgID,Last Name\n1,SMITH\n".encode(), {"ETag": '"v1"'})
+        if "ReportsOutput" in self.path:
+            with server.lock:
+                server.active += 1
+                server.most_active = max(server.most_active, server.active)
+            time.sleep(0.2)
+            with server.lock:
+                server.active -= 1
+            return self.send(200, f"%PDF {self.path.rsplit('/', 1)[1]}".encode())
+        self.send(404)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.searches = 0
+    server.active = server.most_active = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_retries_a_503(server):
+    client = cfrs.CFRSClient(url(server), backoff=0.01)
+
+    assert client.search_candidates("Smith") == [{"IDNumber": 1}]
+    assert server.searches == 3
+
+
+def test_revalidates_cached_responses_with_their_etag(server, tmp_path):
+    client = cfrs.CFRSClient(url(server), cache=str(tmp_path))
+    path = "CFIS_APIService/api/DataDownload/GetCSVDownloadReport"
+    first = client.get(path, {"year": 2024})
+
+    assert cfrs.CFRSClient(url(server), cache=str(tmp_path)).get(path, {"year": 2024}) == first
+    assert server.requests[-1][1].get("If-None-Match") == '"v1"'
+
+
+def test_reports_are_downloaded_concurrently(server):
+    client = cfrs.CFRSClient(url(server))
+    filenames = [f"report-{i}.pdf" for i in range(8)]
+
+    reports = list(client.reports(filenames, workers=4))
+
+    assert reports == [(filename, f"%PDF {filename}".encode()) for filename in filenames]
+    assert server.most_active > 1
+
+
+def test_contributions_csv_strips_the_byte_order_mark(server):
+    client = cfrs.CFRSClient(url(server))
+
+    assert list(client.contributions_csv(2024)) == [{"OrgID": "1", "Last Name": "SMITH"}]
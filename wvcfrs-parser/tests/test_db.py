@@ -0,0 +1,29 @@
+import db
+
+
+def test_replace_pages_keeps_rows_of_pages_that_failed(tmp_path):
+    writer = db.SQLiteWriter(str(tmp_path / "filings.sqlite3"), "rows", {"name": "TEXT"})
+    conn = writer.connect()
+    writer.replace_pages(conn, [(1, "a", [{"name": "one"}]), (2, "b", [{"name": "two"}])], "filing")
+
+    stats = writer.replace_pages(conn, [(1, "a", None), (2, None, [])], "filing")
+
+    assert stats["pages_kept"] == 1 and stats["pages_failed"] == 1
+    assert conn.execute("SELECT page, name FROM rows ORDER BY page").fetchall() == [(1, "one"), (2, "two")]
+    assert writer.page_fingerprints(conn, "filing") == {1: "a", 2: "b"}
+
+
+def test_replace_pages_keeps_rows_outside_of_the_page_range_read(tmp_path):
+    writer = db.SQLiteWriter(str(tmp_path / "filings.sqlite3"), "rows", {"name": "TEXT"})
+    conn = writer.connect()
+    writer.replace_pages(conn, [(page, str(page), [{"name": str(page)}]) for page in range(1, 5)], "filing")
+
+    writer.replace_pages(conn, [(2, "2", None), (3, "new", [{"name": "new"}])], "filing", page_range=(2, 3))
+
+    assert conn.execute("SELECT page, name FROM rows ORDER BY page").fetchall() == [
+        (1, "1"),
+        (2, "2"),
+        (3, "new"),
+        (4, "4"),
+    ]
+    assert writer.page_fingerprints(conn, "filing") == {1: "1", 2: "2", 3: "new", 4: "4"}
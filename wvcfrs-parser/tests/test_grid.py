@@ -0,0 +1,77 @@
+import random
+import cv2
+import numpy as np
+import pytest
+import grid
+import parse
+
+
+def legacy_find_cells(adaptive_thresh: np.ndarray, dpi: int = 200) -> list[list[tuple[int, int, int, int]]]:
+    """
+    The cell boxes found by the per-row morphology and contour search `grid.detect` replaced.
+    """
+    rule_length = max(round(40 * dpi / 200), 1)
+    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (rule_length, 1))
+    detect_horizontal = cv2.morphologyEx(adaptive_thresh, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
+    contours_horizontal, _ = cv2.findContours(detect_horizontal, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contours_horizontal = sorted(contours_horizontal, key=lambda ctr: cv2.boundingRect(ctr)[1])
+
+    rows = []
+    for i in range(len(contours_horizontal) - 1):
+        _, y1, _, h1 = cv2.boundingRect(contours_horizontal[i])
+        _, y2, _, _ = cv2.boundingRect(contours_horizontal[i + 1])
+        row_y0, row_y1 = y1 + h1, y2
+        row = adaptive_thresh[row_y0:row_y1, 0 : adaptive_thresh.shape[1]]
+        vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, rule_length))
+        detect_vertical = cv2.morphologyEx(row, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
+        contours_vertical, _ = cv2.findContours(detect_vertical, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        contours_vertical = sorted(contours_vertical, key=lambda ctr: cv2.boundingRect(ctr)[0])
+        cells = []
+        for j in range(len(contours_vertical) - 1):
+            x1, _, w1, _ = cv2.boundingRect(contours_vertical[j])
+            x2, _, _, _ = cv2.boundingRect(contours_vertical[j + 1])
+            cells.append((x1 + w1, row_y0, x2, row_y1))
+        rows.append(cells)
+    return rows
+
+
+def table_page(seed: int) -> np.ndarray:
+    """
+    A page with a ruled table whose rows range from shorter than a rule (40px at 200 DPI) to tall.
+    """
+    rng = random.Random(seed)
+    image = np.full((1400, 1400, 3), 255, np.uint8)
+    xs = sorted(rng.sample(range(60, 1340, 40), 5))
+    ys = [80]
+    while ys[-1] < 1250:
+        ys.append(ys[-1] + rng.choice([18, 25, 30, 36, 60, 120]))
+    for y in ys:
+        cv2.line(image, (xs[0], y), (xs[-1], y), (0, 0, 0), 2)
+    for x in xs:
+        cv2.line(image, (x, ys[0]), (x, ys[-1]), (0, 0, 0), 2)
+    for y0, y1 in zip(ys, ys[1:]):
+        if y1 - y0 > 30:
+            cv2.putText(image, "JOHN SMITH 12", (xs[0] + 10, y1 - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
+    return image
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_detect_matches_legacy_cells(seed):
+    adaptive_thresh = parse.threshold_image(table_page(seed))
+    assert grid.detect(adaptive_thresh).boxes() == legacy_find_cells(adaptive_thresh)
+
+
+def test_short_rows_have_cells():
+    adaptive_thresh = parse.threshold_image(table_page(0))
+    page_grid = grid.detect(adaptive_thresh)
+    short = [r for r, (y0, y1) in enumerate(page_grid.rows.tolist()) if y1 - y0 < 40]
+    assert short
+    assert all(page_grid.boxes()[r] for r in short)
+
+
+def test_template_matches_short_rows():
+    adaptive_thresh = parse.threshold_image(table_page(1))
+    page_grid = grid.detect(adaptive_thresh)
+    template = grid.ColumnTemplate.from_grid(page_grid, adaptive_thresh.shape[1])
+    templated = grid.detect(adaptive_thresh, template=template)
+    assert [len(cells) for cells in templated.boxes()] == [len(cells) for cells in page_grid.boxes()]
@@ -0,0 +1,51 @@
+import pytest
+import benchmark
+import matching
+
+
+def csv_row(last_name, employer, date, amount):
+    return {
+        "First Name": "JANE",
+        "Middle Name": "",
+        "Last Name": last_name,
+        "Suffix": "",
+        "Employer": employer,
+        "Occupation": "Other",
+        "Receipt Date": f"{date} 12:00:00 AM",
+        "Receipt Amount": amount,
+    }
+
+
+def parsed_row(name, employer_occupation, date, amount):
+    return {"name": name, "employer_occupation": employer_occupation, "date": date, "amount": amount}
+
+
+ROWS = [
+    parsed_row("DOE", None, "04/01/2024", "299.50"),
+    parsed_row("DOE", "ACME", "04/01/2024", "300.00"),
+    parsed_row("ROE", "", "04/03/2024", "300.00"),
+    parsed_row("DOE", "RETIRED RETIRED", "04/02/2024", "250.00"),
+]
+
+
+@pytest.mark.parametrize(
+    "row",
+    [
+        csv_row("DOE", "", "04/01/2024", "300.00"),
+        csv_row("DOE", "ACME", "04/01/2024", "300.00"),
+        csv_row("ROE", "", "04/03/2024", "300.00"),
+        csv_row("DOE", "RETIRED", "04/02/2024", "250.00"),
+        csv_row("DOE", None, "04/02/2024", "260.00"),
+    ],
+)
+@pytest.mark.parametrize("blocking", [True, False])
+def test_matcher_scores_empty_fields_like_the_legacy_scorer(row, blocking):
+    expected, expected_score = benchmark.legacy_find_best_match(row, ROWS)
+    match, score = matching.Matcher(ROWS, blocking=blocking).best_match(row)
+
+    assert match is expected
+    assert score == pytest.approx(expected_score)
+
+
+def test_ratios_of_empty_strings():
+    assert matching.ratios(["", "A"], ["", "A", "B"]).tolist() == [[100, 0, 0], [0, 100, 0]]
@@ -0,0 +1,20 @@
+import sqlite3
+import ocr
+
+
+def test_ocr_cache_put_does_not_hold_the_write_lock(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ocr.OCRCache(path)
+    assert cache.get("a") is None
+    cache.put("a", "text")
+
+    # another worker can write while entries are pending
+    other = sqlite3.connect(path, timeout=0)
+    with other:
+        other.execute("INSERT INTO ocr_cache_stats (name, value) VALUES ('probe', 1)")
+
+    assert cache.get("a") == "text"
+    cache.commit()
+    assert ocr.OCRCache(path).get("b") is None
+    assert other.execute("SELECT text FROM ocr_cache WHERE key = 'a'").fetchone() == ("text",)
+    assert cache.stats()["bytes"] > 0
@@ -0,0 +1,23 @@
+import os
+import time
+import parse
+
+
+def _read_page(page, *args, **kwargs):
+    if page == 7:
+        os._exit(1)
+    time.sleep(0.05)
+    return [[str(page)]]
+
+
+def test_iter_page_rows_survives_a_worker_crash(monkeypatch, capsys):
+    # worker processes are forked, so they read pages with the stub too
+    monkeypatch.setattr(parse, "_read_page", _read_page)
+    pages = []
+    for rows in parse.iter_page_rows(list(range(1, 13)), workers=4):
+        pages.append(rows)
+        # a slow consumer lets the crash break the pool between collecting one page and submitting the next
+        time.sleep(0.3)
+
+    assert pages == [[[str(page)]] if page != 7 else [] for page in range(1, 13)]
+    assert "Error processing page 7: worker process crashed" in capsys.readouterr().out